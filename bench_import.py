@@ -0,0 +1,108 @@
+"""
+Measure what importing the plugin costs angr-management at startup.
+
+    python bench_import.py [--repeat N] [--json] [--importtime]
+
+Each module is imported in a fresh interpreter, as load_plugin_module does, so nothing is cached between runs. For
+every module the best wall time is reported together with the heavy dependencies the import pulled in. Importing
+seed_table_plugin should load neither SQLAlchemy, Slacrs, tornado nor the database drivers: those wait until the Seed
+Table view is first shown or a project is loaded. --importtime also prints Python's own -X importtime breakdown of
+the slowest imports.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+MODULES = ["seed_common", "seed_table", "seed_table_plugin"]
+
+HEAVY_MODULES = ["sqlalchemy", "slacrs", "tornado", "psycopg2", "PySide2", "angrmanagement"]
+
+# run in the child interpreter: import one plugin module without the package __init__, print the cost as JSON. An
+# empty module name imports nothing, as a baseline of what the probe itself loads.
+PROBE = """
+import importlib, json, sys, types
+from time import perf_counter
+package = types.ModuleType("seed_table_plugin")
+package.__path__ = [{directory!r}]
+sys.modules["seed_table_plugin"] = package
+before = set(sys.modules)
+start = perf_counter()
+error = None
+try:
+    if {module!r}:
+        importlib.import_module("seed_table_plugin.{module}")
+except Exception as e:
+    error = f"{{type(e).__name__}}: {{e}}"
+elapsed = perf_counter() - start
+loaded = set(sys.modules) - before
+print(json.dumps({{
+    "time": elapsed,
+    "modules": len(loaded),
+    "heavy": sorted(name for name in {heavy!r} if name in loaded),
+    "error": error,
+}}))
+"""
+
+
+def probe(module, importtime=False):
+    directory = os.path.dirname(os.path.abspath(__file__))
+    code = PROBE.format(directory=directory, module=module, heavy=HEAVY_MODULES)
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def imported_names(importtime_output):
+    return {line.split("|")[-1].strip() for line in importtime_output.splitlines() if line.startswith("import time:")}
+
+
+def slowest_imports(importtime_output, exclude=(), count=10):
+    """
+    The count imports with the largest cumulative time, from -X importtime output, leaving out the names in exclude.
+    """
+    entries = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time: <self us> | <cumulative us> | <name>"
+        _, cumulative, name = line.split("|")
+        if name.strip() not in exclude:
+            entries.append((int(cumulative), name.strip()))
+    return sorted(entries, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--importtime", action="store_true", help="show the slowest imports of each module")
+    args = parser.parse_args()
+
+    baseline = imported_names(probe("", importtime=True)[1]) if args.importtime else set()
+    results = {}
+    for module in MODULES:
+        runs = [probe(module)[0] for _ in range(args.repeat)]
+        result = min(runs, key=lambda run: run["time"])
+        if args.importtime:
+            result["slowest"] = slowest_imports(probe(module, importtime=True)[1], exclude=baseline)
+        results[module] = result
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'module':<20} {'import':>10} {'modules':>8}  heavy dependencies")
+    for module, result in results.items():
+        heavy = ", ".join(result["heavy"]) or "-"
+        print(f"{module:<20} {result['time'] * 1000:>8.1f}ms {result['modules']:>8}  {heavy}")
+        if result["error"]:
+            print(f"{'':<20} import failed: {result['error']}")
+        for cumulative, name in result.get("slowest", []):
+            print(f"{'':<20} {cumulative / 1000:>8.1f}ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
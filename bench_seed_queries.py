@@ -0,0 +1,340 @@
+"""
+Headless benchmark suite for the seed table query paths.
+
+    python bench_seed_queries.py [--database URL] [--count N] [--output results.json]
+
+Drives SeedTable with stub workspace and connector objects, so neither PySide2 nor angr-management is needed. By
+default a corpus of --count inputs is generated with seed_loader into a temporary SQLite file; pass --database to run
+against an existing SQLite file or a local Postgres (add --load to generate the corpus there too). Timings are written
+as JSON so runs can be compared.
+"""
+import argparse
+import importlib
+import itertools
+import json
+import os
+import platform
+import queue
+import sys
+import tempfile
+import threading
+import types
+
+from time import perf_counter
+
+from slacrs import Slacrs
+from slacrs.model import Input
+
+import seed_loader
+
+
+def load_plugin_module(name):
+    """
+    Import a module of this plugin without executing the package __init__, which needs angr-management.
+    """
+    package_name = "seed_table_plugin"
+    if package_name not in sys.modules:
+        package = types.ModuleType(package_name)
+        package.__path__ = [os.path.dirname(os.path.abspath(__file__))]
+        sys.modules[package_name] = package
+    return importlib.import_module(f"{package_name}.{name}")
+
+
+seed_table = load_plugin_module("seed_table")
+seed_search = load_plugin_module("seed_search")
+
+# measure the database, not the persistent local cache
+seed_table.SeedTable.local_cache_dir = None
+
+
+class StubEvent:
+    def __init__(self, kind, object_id):
+        self.kind = kind
+        self.object_id = object_id
+
+
+class StubSlacrs:
+    """
+    Slacrs instance whose event stream is fed by the benchmark instead of the database.
+    """
+    def __init__(self, slacrs):
+        self.slacrs = slacrs
+        self.event_queue = queue.Queue()
+        self.pending_events = queue.Queue()
+
+    def session(self):
+        return self.slacrs.session()
+
+    def fetch_events(self):
+        count = 0
+        while not self.pending_events.empty():
+            self.event_queue.put(self.pending_events.get_nowait())
+            count += 1
+        return count
+
+
+class StubConnector:
+    def __init__(self, slacrs, target_image_id):
+        self._slacrs = slacrs
+        self.target_image_id = target_image_id
+
+    def slacrs_instance(self):
+        return self._slacrs
+
+
+class StubPlugins:
+    def __init__(self, connector):
+        self.connector = connector
+
+    def get_plugin_instance_by_name(self, name):
+        return self.connector if name == "ChessConnector" else None
+
+
+class StubWorkspace:
+    def __init__(self, connector):
+        self.plugins = StubPlugins(connector)
+
+    def log(self, message):
+        print(message, file=sys.stderr)
+
+
+class StubSignal:
+    def emit(self, *args):
+        pass
+
+
+class StubQuerySignal:
+    querySignal = StubSignal()
+
+
+# seconds to wait for a query result before giving up on it
+RESULT_TIMEOUT = 600
+
+
+class SeedTableBench:
+    def __init__(self, slacrs, target_image_id, repeat=3):
+        self.slacrs = StubSlacrs(slacrs)
+        self.repeat = repeat
+        self.results = []
+        self.pages = queue.Queue()
+        self.counts = queue.Queue()
+        self.live = queue.Queue()
+        self.stats = queue.Queue()
+        self.ready = threading.Event()
+        connector = StubConnector(self.slacrs, target_image_id)
+        self.table = seed_table.SeedTable(StubWorkspace(connector), StubQuerySignal(),
+                                          seed_callback=self.on_page,
+                                          count_callback=self.counts.put,
+                                          target_callback=self.ready.set,
+                                          live_callback=lambda seeds, key=None: self.live.put(seeds),
+                                          stats_callback=lambda target_image_id, histogram: self.stats.put(histogram))
+        self.table.executor.debounce = 0
+        self.table.poll_interval_max = self.table.poll_interval_min
+        self.ready.wait()
+
+    def on_page(self, seeds, page_no=None, key=None, metrics=None):
+        if metrics is not None:
+            self.table.record_metrics(metrics)
+        self.pages.put(seeds)
+
+    def record(self, name, seconds, **params):
+        result = {"name": name, "seconds": seconds, **params}
+        self.results.append(result)
+        print(json.dumps(result), file=sys.stderr)
+
+    def timed(self, fn):
+        """
+        Best wall clock time of fn over the configured repetitions, along with its last result.
+        """
+        best = None
+        result = None
+        for _ in range(self.repeat):
+            start = perf_counter()
+            result = fn()
+            elapsed = perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def page(self, inp=None, tags=(), offset=0, after=None, size=50):
+        self.table.get_seeds(inp=inp, tags=list(tags), offset=offset, size=size, after=after, slot="bench")
+        return self.pages.get(timeout=RESULT_TIMEOUT)
+
+    def count(self, inp=None, tags=()):
+        with self.table.counts_lock:
+            self.table.counts.clear()
+        self.table.get_count(inp, list(tags))
+        return self.counts.get(timeout=RESULT_TIMEOUT)
+
+    def bench_pages(self, total, size=50):
+        seconds, seeds = self.timed(lambda: self.page(size=size))
+        self.record("first_page", seconds, rows=len(seeds))
+
+        deep_page = max(total // size - 1, 1)
+        seconds, seeds = self.timed(lambda: self.page(offset=deep_page * size, size=size))
+        self.record("deep_page_offset", seconds, page=deep_page + 1, rows=len(seeds))
+
+        previous = self.page(offset=(deep_page - 1) * size, size=size)
+        if previous:
+            seconds, seeds = self.timed(lambda: self.page(after=previous[-1].key, size=size))
+            self.record("deep_page_keyset", seconds, page=deep_page + 1, rows=len(seeds))
+
+    def bench_sorts(self, total, size=50):
+        """
+        First page and a deep keyset page in each sorted order, see SeedPageQuery.query_seeds.
+        """
+        deep_page = max(total // size - 1, 1)
+        for sort in [("size", False), ("size", True), ("crashing", False), ("crashing", True)]:
+            self.table.sort = sort
+            name = f"{sort[0]}_{'desc' if sort[1] else 'asc'}"
+            seconds, seeds = self.timed(lambda: self.page(size=size))
+            self.record("sorted_first_page", seconds, sort=name, rows=len(seeds))
+            previous = self.page(offset=(deep_page - 1) * size, size=size)
+            if previous:
+                after = previous[-1].sort_key(sort)
+                seconds, seeds = self.timed(lambda: self.page(after=after, size=size))
+                self.record("sorted_deep_page_keyset", seconds, sort=name, page=deep_page + 1, rows=len(seeds))
+        self.table.sort = seed_table.DEFAULT_SORT
+
+    def bench_count(self):
+        seconds, count = self.timed(self.count)
+        self.record("count", seconds, count=count)
+
+    def bench_tags(self):
+        for n in range(1, len(seed_table.SEED_TAGS) + 1):
+            for tags in itertools.combinations(seed_table.SEED_TAGS, n):
+                seconds, seeds = self.timed(lambda: self.page(tags=tags))
+                self.record("tag_page", seconds, tags=list(tags), rows=len(seeds))
+                seconds, count = self.timed(lambda: self.count(tags=tags))
+                self.record("tag_count", seconds, tags=list(tags), count=count)
+
+    def tag_stats(self):
+        with self.table.counts_lock:
+            self.table.tag_stats.clear()
+        self.table.get_tag_stats()
+        return self.stats.get(timeout=RESULT_TIMEOUT)
+
+    def bench_tag_stats(self):
+        """
+        One grouped query answering the counts of every tag combination, against the per-combination counts of
+        bench_tags.
+        """
+        seconds, histogram = self.timed(self.tag_stats)
+        self.record("tag_stats", seconds, masks=len(histogram))
+
+    def bench_search(self, patterns, index=False):
+        if index:
+            session = self.slacrs.session()
+            try:
+                start = perf_counter()
+                seed_search.create_search_index(session)
+                self.record("search_index_build", perf_counter() - start)
+                self.table.search_index = seed_search.search_index_kind(session)
+            finally:
+                session.close()
+        for pattern in patterns:
+            seconds, seeds = self.timed(lambda: self.page(inp=pattern))
+            self.record("search_page", seconds, pattern=pattern.hex(), index=self.table.search_index, rows=len(seeds))
+            seconds, count = self.timed(lambda: self.count(inp=pattern))
+            self.record("search_count", seconds, pattern=pattern.hex(), index=self.table.search_index, count=count)
+
+    def bench_ingestion(self, count, size):
+        """
+        Insert new inputs, announce them through the event stream and time until every one reached live_callback.
+        """
+        session = self.slacrs.session()
+        try:
+            before = {input_id for (input_id,) in session.query(Input.id)}
+            seed_loader.bulk_load_seeds(session, self.table.connector.target_image_id, count,
+                                        sizes=seed_loader.parse_sizes(f"fixed:{size}"), seed=1)
+            new_ids = [input_id for (input_id,) in session.query(Input.id) if input_id not in before]
+        finally:
+            session.close()
+
+        # the live path delivers seeds of the current filter
+        self.count()
+        start = perf_counter()
+        for input_id in new_ids:
+            self.slacrs.pending_events.put(StubEvent("input", input_id))
+        received = 0
+        while received < len(new_ids):
+            received += len(self.live.get(timeout=RESULT_TIMEOUT))
+        seconds = perf_counter() - start
+        self.record("live_ingestion", seconds, seeds=received, seeds_per_second=received / seconds)
+
+    def close(self):
+        self.table.should_exit = True
+        self.table.executor.shutdown()
+        self.table.pool.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", help="database URL (default: a temporary SQLite file)")
+    parser.add_argument("--load", action="store_true", help="generate the corpus in --database")
+    parser.add_argument("--target-image-id", help="benchmark an existing target image of --database")
+    parser.add_argument("--count", type=int, default=10000, help="size of the generated corpus")
+    parser.add_argument("--sizes", default="lognormal:7:1.5:100000", help="value size distribution, see seed_loader")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--live", type=int, default=2000, help="number of seeds for the ingestion benchmark")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    database = args.database
+    if database is None:
+        database = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="seed_bench_"), "slacrs.sqlite")
+        args.load = True
+
+    slacrs = Slacrs(database=database)
+    session = slacrs.session()
+    try:
+        target_image_id = args.target_image_id
+        if target_image_id is None:
+            target_image_id = seed_loader.create_target_image(session, name="bench")
+        if args.load:
+            start = perf_counter()
+            seed_loader.bulk_load_seeds(session, target_image_id, args.count,
+                                        sizes=seed_loader.parse_sizes(args.sizes), seed=0)
+            load_seconds = perf_counter() - start
+        else:
+            load_seconds = None
+        total = session.query(Input).filter(Input.target_image_id == target_image_id).count()
+        dialect = session.bind.dialect.name
+    finally:
+        session.close()
+
+    bench = SeedTableBench(slacrs, target_image_id, repeat=args.repeat)
+    try:
+        bench.bench_pages(total)
+        bench.bench_sorts(total)
+        bench.bench_count()
+        bench.bench_tags()
+        bench.bench_tag_stats()
+        patterns = [b"A", b"abc", b"\x00\xff", b"0123456789"]
+        bench.bench_search(patterns)
+        if bench.table.search_index is None:
+            bench.bench_search(patterns, index=True)
+        if args.live:
+            bench.bench_ingestion(args.live, 1000)
+        pool_stats = bench.table.pool_stats()
+        stages = bench.table.recorder.summary()
+    finally:
+        bench.close()
+
+    report = {
+        "database": dialect,
+        "corpus": {"inputs": total, "sizes": args.sizes, "load_seconds": load_seconds},
+        "python": platform.python_version(),
+        "results": bench.results,
+        "pool": pool_stats,
+        "stages": stages,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as outfile:
+            outfile.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
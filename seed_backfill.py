@@ -0,0 +1,54 @@
+"""
+Helpers shared by the side tables and indexes of the seed table (seed_indexes, seed_search and seed_dedup): filling a
+per-input side table in batches, and the command line that creates them on a database.
+"""
+import argparse
+
+from sqlalchemy import select
+
+try:
+    from slacrs import Slacrs
+    from slacrs.model import Input
+except ImportError as ex:
+    Slacrs = None
+
+
+def missing_inputs(query, table, input_ids=None):
+    """
+    Restrict a query over Input to the inputs without a row in a side table keyed by input_id, among input_ids if
+    given.
+    """
+    if input_ids is not None:
+        query = query.filter(Input.id.in_(input_ids))
+    return query.filter(Input.id.notin_(select(table.c.input_id)))
+
+
+def insert_batched(session, table, rows, batch_size):
+    """
+    Insert rows into table, batch_size of them per statement, then commit. Rows are consumed as they are produced,
+    so a query streamed with yield_per is never held in memory whole.
+    """
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            session.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        session.execute(table.insert(), batch)
+    session.commit()
+
+
+def run_on_database(description, create):
+    """
+    Command line entry point: call create with a session on the database given by --database.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--database", required=True)
+    args = parser.parse_args()
+
+    session = Slacrs(database=args.database).session()
+    try:
+        create(session)
+    finally:
+        session.close()
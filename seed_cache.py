@@ -0,0 +1,215 @@
+"""
+Persistent local cache of seed metadata and values, so the seed table starts from disk instead of the database.
+
+Each target image of each database gets a SQLite file with the columns the table shows (id, created_at, tag bitmask,
+size and preview) for every seed up to a (created_at, id) high-water mark. The plugin syncs it by asking the
+database only for the seeds past that mark, and serves pages from it while it covers them. Tags can be added after
+their input, so each sync also rereads the tags of the newest cached seeds. Full values are cached separately,
+content-addressed by their BLAKE2b digest and evicted least recently used beyond a size budget.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+
+from collections import namedtuple
+from datetime import datetime
+from typing import List, Optional
+
+
+def default_cache_dir() -> str:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "seed_table_plugin")
+
+
+def database_key(url) -> str:
+    """
+    Identify a database by its SQLAlchemy URL, leaving the credentials out.
+    """
+    return f"{url.drivername}://{url.host or ''}:{url.port or ''}/{url.database or ''}"
+
+
+# a cached seed, shaped like the rows of seed_table.seed_query so make_seeds accepts it
+LocalSeedRow = namedtuple("LocalSeedRow", ["id", "created_at", "tag_mask", "size", "preview"])
+
+
+def encode_time(value: datetime) -> str:
+    # fixed width, so the text order is the time order
+    return value.isoformat(timespec="microseconds")
+
+
+class LocalSeedCache:
+    """
+    Seed metadata of one target image, stored in a local SQLite file.
+    """
+    def __init__(self, directory: str, database: str, target_image_id):
+        os.makedirs(directory, exist_ok=True)
+        name = hashlib.blake2b(f"{database}#{target_image_id}".encode(), digest_size=12).hexdigest()
+        self.path = os.path.join(directory, f"{name}.sqlite")
+        self.target_image_id = target_image_id
+        # set once a sync has reached the database's newest seed; until then only full pages are served
+        self.live = False
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS seeds (
+                input_id PRIMARY KEY, created_at TEXT NOT NULL, tag_mask INTEGER, size INTEGER, preview BLOB
+            );
+            CREATE INDEX IF NOT EXISTS ix_seeds_created_id ON seeds (created_at, input_id);
+        """)
+        self._db.commit()
+
+    def high_water_mark(self):
+        """
+        (created_at, id) of the newest cached seed, or None when nothing is cached yet.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT created_at, input_id FROM seeds ORDER BY created_at DESC, input_id DESC "
+                                   "LIMIT 1").fetchone()
+        if row is None:
+            return None
+        return datetime.fromisoformat(row[0]), row[1]
+
+    def add(self, rows):
+        """
+        Store seed_query rows (with a value loader, so previews rather than values).
+        """
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO seeds VALUES (?, ?, ?, ?, ?)",
+                                 [(row.id, encode_time(row.created_at), int(row.tag_mask), row.size,
+                                   bytes(row.preview)) for row in rows])
+            self._db.commit()
+
+    def recent_ids(self, count: int) -> list:
+        """
+        Ids of the count newest cached seeds.
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT input_id FROM seeds ORDER BY created_at DESC, input_id DESC LIMIT ?",
+                                    (count,)).fetchall()
+        return [input_id for (input_id,) in rows]
+
+    def update_tags(self, masks):
+        """
+        Store the current tag bitmasks of cached seeds, from (input_id, tag_mask) pairs.
+        """
+        with self._lock:
+            self._db.executemany("UPDATE seeds SET tag_mask = ? WHERE input_id = ?",
+                                 [(int(tag_mask), input_id) for input_id, tag_mask in masks])
+            self._db.commit()
+
+    def page(self, tags_mask: int, offset: int, size: int, after=None, before=None) -> Optional[List[LocalSeedRow]]:
+        """
+        One page of cached seeds carrying all tags of tags_mask, located like SeedPageQuery.query_seeds does. Returns
+        None when the cache cannot answer: only seeds newer than the last sync can be missing, so a page that is not
+        full is only trusted when it was located backwards or the cache is live.
+        """
+        where = "(tag_mask & ?) = ?"
+        params = [tags_mask, tags_mask]
+        if after is not None:
+            where += " AND (created_at, input_id) > (?, ?)"
+            params += [encode_time(after[0]), after[1]]
+            order = "created_at, input_id"
+        elif before is not None:
+            where += " AND (created_at, input_id) < (?, ?)"
+            params += [encode_time(before[0]), before[1]]
+            order = "created_at DESC, input_id DESC"
+        else:
+            order = "created_at, input_id"
+        sql = f"SELECT input_id, created_at, tag_mask, size, preview FROM seeds WHERE {where} ORDER BY {order} " \
+              f"LIMIT ? OFFSET ?"
+        params += [size, offset if after is None and before is None else 0]
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        if len(rows) < size and before is None and not self.live:
+            return None
+        if before is not None:
+            rows.reverse()
+        return [LocalSeedRow(input_id, datetime.fromisoformat(created_at), tag_mask, size, preview)
+                for input_id, created_at, tag_mask, size, preview in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class BlobCache:
+    """
+    Content-addressed store of full seed values, shared by every target. Values live in files named by their digest,
+    so identical seeds are stored once; the least recently used ones are removed when the total exceeds budget.
+    """
+    def __init__(self, directory: str, budget=256 * 1024 * 1024):
+        self.directory = os.path.join(directory, "blobs")
+        os.makedirs(self.directory, exist_ok=True)
+        self.budget = budget
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(self.directory, "index.sqlite"), check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER, accessed INTEGER);
+            CREATE INDEX IF NOT EXISTS ix_blobs_accessed ON blobs (accessed);
+            CREATE TABLE IF NOT EXISTS refs (key TEXT PRIMARY KEY, digest TEXT);
+            CREATE INDEX IF NOT EXISTS ix_refs_digest ON refs (digest);
+        """)
+        self._db.commit()
+        # logical clock of accesses, for the LRU order
+        self._clock = self._db.execute("SELECT coalesce(max(accessed), 0) FROM blobs").fetchone()[0]
+        self.used = self._db.execute("SELECT coalesce(sum(size), 0) FROM blobs").fetchone()[0]
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest[2:])
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._db.execute("SELECT digest FROM refs WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            digest = row[0]
+            try:
+                with open(self._path(digest), "rb") as infile:
+                    value = infile.read()
+            except OSError:
+                self._db.execute("DELETE FROM refs WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._clock += 1
+            self._db.execute("UPDATE blobs SET accessed = ? WHERE digest = ?", (self._clock, digest))
+            self._db.commit()
+            return value
+
+    def put(self, key: str, value: bytes):
+        if len(value) > self.budget:
+            return
+        digest = hashlib.blake2b(value).hexdigest()
+        with self._lock:
+            self._clock += 1
+            known = self._db.execute("SELECT 1 FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            if known is None:
+                path = self._path(digest)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as outfile:
+                    outfile.write(value)
+                self._db.execute("INSERT INTO blobs VALUES (?, ?, ?)", (digest, len(value), self._clock))
+                self.used += len(value)
+            else:
+                self._db.execute("UPDATE blobs SET accessed = ? WHERE digest = ?", (self._clock, digest))
+            self._db.execute("INSERT OR REPLACE INTO refs VALUES (?, ?)", (key, digest))
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        while self.used > self.budget:
+            row = self._db.execute("SELECT digest, size FROM blobs ORDER BY accessed LIMIT 1").fetchone()
+            if row is None:
+                break
+            digest, size = row
+            try:
+                os.remove(self._path(digest))
+            except OSError:
+                pass
+            self._db.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+            self._db.execute("DELETE FROM refs WHERE digest = ?", (digest,))
+            self.used -= size
+
+    def close(self):
+        with self._lock:
+            self._db.close()
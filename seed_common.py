@@ -0,0 +1,110 @@
+"""
+Definitions shared by the Qt side of the plugin and the seed queries. This module only needs the standard library,
+so the plugin can be imported without loading SQLAlchemy, Slacrs or the database drivers.
+"""
+import threading
+
+from collections import OrderedDict
+from typing import Dict
+
+
+# known input tags, stored per seed as a bitmask
+SEED_TAGS = [
+    "non-crashing",
+    "crashing",
+    "leaking",
+    "non-terminating",
+    "exploit",
+]
+TAG_BITS: Dict[str, int] = {tag: 1 << i for i, tag in enumerate(SEED_TAGS)}
+
+
+# (column, descending) order of seed pages; sorts on size and tag flags fall back to this order for ties
+DEFAULT_SORT = ("created_at", False)
+
+
+def tags_to_mask(tags) -> int:
+    mask = 0
+    for tag in tags:
+        mask |= TAG_BITS.get(tag, 0)
+    return mask
+
+
+def count_tagged(histogram: Dict[int, int], tags) -> int:
+    """
+    Number of inputs carrying all of the given tags, from a tag bitmask histogram.
+    """
+    mask = tags_to_mask(tags)
+    return sum(count for tag_mask, count in histogram.items() if tag_mask & mask == mask)
+
+
+class SeedPageCache:
+    """
+    LRU cache of seed pages, keyed by a filter key (see SeedTable.filter_key) plus the page, and bounded by the
+    estimated memory use of the cached seeds.
+    """
+    def __init__(self, budget=64 * 1024 * 1024):
+        self.budget = budget
+        self.used = 0
+        self._pages: OrderedDict = OrderedDict()
+        self._sizes: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._pages
+
+    def get(self, key):
+        with self._lock:
+            seeds = self._pages.get(key)
+            if seeds is not None:
+                self._pages.move_to_end(key)
+            return seeds
+
+    def peek(self, key):
+        """
+        Like get, without marking the page as recently used.
+        """
+        with self._lock:
+            return self._pages.get(key)
+
+    def put(self, key, seeds: list):
+        size = sum(seed.memory_size() for seed in seeds)
+        with self._lock:
+            if key in self._pages:
+                self.used -= self._sizes[key]
+            self._pages[key] = seeds
+            self._pages.move_to_end(key)
+            self._sizes[key] = size
+            self.used += size
+            # always keep the page just added
+            while self.used > self.budget and len(self._pages) > 1:
+                old_key, _ = self._pages.popitem(last=False)
+                self.used -= self._sizes.pop(old_key)
+
+    def resize(self, key):
+        """
+        Recompute the size of a cached page after its seeds changed.
+        """
+        with self._lock:
+            seeds = self._pages.get(key)
+            if seeds is None:
+                return
+            size = sum(seed.memory_size() for seed in seeds)
+            self.used += size - self._sizes[key]
+            self._sizes[key] = size
+
+    def discard(self, predicate):
+        """
+        Drop every page for which predicate(key, seeds) holds.
+        """
+        with self._lock:
+            for key in [key for key, seeds in self._pages.items() if predicate(key, seeds)]:
+                del self._pages[key]
+                self.used -= self._sizes.pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self._sizes.clear()
+            self.used = 0
@@ -0,0 +1,106 @@
+"""
+Content hash index used to show byte-identical seeds once.
+
+    python seed_dedup.py --database URL
+
+The BLAKE2b digest of every input is stored once in the seed_hashes side table, next to the input's target image.
+(target_image_id, digest, input_id) is indexed, so the duplicates of a seed and whether it is the first of its
+digest (the one shown in the deduplicated view) are index lookups, and no value is hashed again at query time. This
+script creates the table and hashes the existing inputs. The plugin hashes the inputs created while it was not
+running when it starts, and new inputs of every target as the event stream delivers them.
+"""
+import hashlib
+
+from sqlalchemy import Column, Index, LargeBinary, MetaData, Table, exists, func, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+
+try:
+    from slacrs import Slacrs
+    from slacrs.model import Input
+except ImportError as ex:
+    Slacrs = None
+
+try:
+    from .seed_backfill import insert_batched, missing_inputs, run_on_database
+except ImportError:
+    # run as a script
+    from seed_backfill import insert_batched, missing_inputs, run_on_database
+
+
+HASH_TABLE = "seed_hashes"
+
+# bytes of BLAKE2b digest kept per input
+DIGEST_SIZE = 16
+
+# inputs hashed per statement
+HASH_BATCH_SIZE = 500
+
+hash_table = Table(
+    HASH_TABLE, MetaData(),
+    Column("input_id", Input.__table__.c.id.type, primary_key=True),
+    Column("target_image_id", Input.__table__.c.target_image_id.type),
+    Column("digest", LargeBinary(DIGEST_SIZE), nullable=False),
+    Index("ix_seed_hashes_target_digest", "target_image_id", "digest", "input_id"),
+) if Slacrs else None
+
+
+def digest(value: bytes) -> bytes:
+    return hashlib.blake2b(value, digest_size=DIGEST_SIZE).digest()
+
+
+def create_hash_table(session):
+    """
+    Create the hash table if needed and hash every input that is not hashed yet.
+    """
+    hash_table.create(bind=session.connection(), checkfirst=True)
+    session.commit()
+    hash_inputs(session)
+
+
+def hash_inputs(session, input_ids=None):
+    """
+    Add inputs to the hash table: the given ids, or every input that is not hashed yet.
+    """
+    query = missing_inputs(session.query(Input.id, Input.target_image_id, Input.value), hash_table, input_ids)
+    rows = ({"input_id": input_id, "target_image_id": target_image_id, "digest": digest(value)}
+            for input_id, target_image_id, value in query.yield_per(HASH_BATCH_SIZE))
+    insert_batched(session, hash_table, rows, HASH_BATCH_SIZE)
+
+
+def has_hash_table(session) -> bool:
+    if isinstance(session.bind.dialect, postgresql.dialect):
+        found = session.execute(text("SELECT 1 FROM pg_tables WHERE tablename = :name"), {"name": HASH_TABLE}).first()
+    elif isinstance(session.bind.dialect, sqlite.dialect):
+        found = session.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": HASH_TABLE}).first()
+    else:
+        return False
+    return found is not None
+
+
+def unique_filter(query):
+    """
+    Keep only the first input (by id) of each digest within its target image, in a query over Input. Each input is
+    checked with one index probe for an earlier input with the same digest. Inputs that are not hashed yet are left
+    out.
+    """
+    own = hash_table.alias("own_hash")
+    earlier = hash_table.alias("earlier_hash")
+    has_earlier = exists().where(earlier.c.target_image_id == own.c.target_image_id,
+                                 earlier.c.digest == own.c.digest,
+                                 earlier.c.input_id < own.c.input_id)
+    return query.filter(exists().where(own.c.input_id == Input.id).where(~has_earlier))
+
+
+def duplicate_count_column():
+    """
+    Correlated scalar subquery counting the inputs of an Input's target image with the same content, itself included.
+    """
+    own = hash_table.alias("counted_hash")
+    same = hash_table.alias("same_hash")
+    return select(func.count()).select_from(own).join(
+        same, (same.c.target_image_id == own.c.target_image_id) & (same.c.digest == own.c.digest)
+    ).where(own.c.input_id == Input.id).scalar_subquery()
+
+
+if __name__ == "__main__":
+    run_on_database("Create the seed content hash index.", create_hash_table)
@@ -0,0 +1,45 @@
+"""
+Indexes supporting the seed table queries.
+
+    python seed_indexes.py --database URL
+
+Seed pages are scoped to one target image and ordered by (created_at, id), which (target_image_id, created_at, id)
+answers directly, including keyset bounds; pages sorted by size are ordered by (length(value), created_at, id) within
+a target image, which an expression index answers the same way. The tag filter, the tag bitmask column and the tag
+sorts look tags up per input, which (input_id, value) answers from the index alone.
+"""
+from sqlalchemy import Index, func
+
+try:
+    from slacrs import Slacrs
+    from slacrs.model import Input, InputTag
+except ImportError as ex:
+    Slacrs = None
+
+try:
+    from .seed_backfill import run_on_database
+except ImportError:
+    # run as a script
+    from seed_backfill import run_on_database
+
+
+SEED_INDEXES = [
+    Index("ix_inputs_target_created_id", Input.target_image_id, Input.created_at, Input.id),
+    Index("ix_inputs_target_size_created_id", Input.target_image_id, func.length(Input.value), Input.created_at,
+          Input.id),
+    Index("ix_input_tags_input_value", InputTag.input_id, InputTag.value),
+] if Slacrs else []
+
+
+def create_seed_indexes(session):
+    """
+    Create the seed table indexes that do not exist yet.
+    """
+    connection = session.connection()
+    for index in SEED_INDEXES:
+        index.create(bind=connection, checkfirst=True)
+    session.commit()
+
+
+if __name__ == "__main__":
+    run_on_database("Create the indexes used by the seed table.", create_seed_indexes)
@@ -0,0 +1,162 @@
+"""
+Per-stage timing of seed queries.
+
+Every page and count request carries a QueryMetrics through its stages: waiting in the executor queue (debounce
+included), acquiring a pooled connection, running the SQL and fetching the rows, building Seed objects, and updating
+the Qt model. Finished metrics go to a MetricsRecorder, which keeps recent ones for the status panel, logs them and
+passes them to an optional callback. Queries slower than its threshold get their plan captured with EXPLAIN, using the
+exact statement and parameters sent to the database.
+"""
+import json
+import logging
+import threading
+
+from collections import deque
+from contextlib import contextmanager
+from time import perf_counter
+
+from sqlalchemy import event
+from sqlalchemy.dialects import sqlite
+
+
+l = logging.getLogger(__name__)
+
+# timed stages, in the order they run
+STAGES = ["queue_wait", "connect", "sql", "hydration", "model_update"]
+
+
+class QueryMetrics:
+    """
+    Timings of one seed query, in seconds. Stages that did not run stay None.
+    """
+    def __init__(self, kind, key=None):
+        self.kind = kind
+        self.slot = None
+        self.key = key
+        self.status = "ok"
+        self.queue_wait = None
+        self.connect = None
+        self.sql = None
+        self.hydration = None
+        self.model_update = None
+        self.rows = None
+        self.bytes = None
+        self.plan = None
+        # set once the metrics are handed over to whoever finishes and records them
+        self.delivered = False
+
+    @property
+    def total(self) -> float:
+        return sum(getattr(self, stage) or 0 for stage in STAGES)
+
+    def as_dict(self) -> dict:
+        result = {"kind": self.kind, "slot": self.slot, "status": self.status}
+        if self.key is not None:
+            target_image_id, inp, tags = self.key[:3]
+            result.update(target_image_id=target_image_id, inp=inp.hex() if inp else None, tags=list(tags))
+        for stage in STAGES:
+            result[stage] = getattr(self, stage)
+        result.update(total=self.total, rows=self.rows, bytes=self.bytes, plan=self.plan)
+        return result
+
+    def describe(self) -> str:
+        parts = [f"{self.slot or self.kind:<14}"]
+        for stage in STAGES:
+            value = getattr(self, stage)
+            if value is not None:
+                parts.append(f"{stage} {value * 1000:.1f}ms")
+        if self.rows is not None:
+            parts.append(f"{self.rows} rows")
+        if self.bytes is not None:
+            parts.append(f"{self.bytes / 1024:.1f} KiB")
+        if self.status != "ok":
+            parts.append(f"({self.status})")
+        return "  ".join(parts)
+
+
+class MetricsRecorder:
+    """
+    Keeps the most recent QueryMetrics, logs every one of them and reports them to callback.
+    """
+    def __init__(self, callback=None, history=100, slow_query_time=1.0):
+        self.callback = callback
+        # SQL time in seconds above which a query's plan is captured
+        self.slow_query_time = slow_query_time
+        self.history = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def record(self, metrics: QueryMetrics):
+        with self._lock:
+            self.history.append(metrics)
+        if metrics.plan:
+            l.warning("Slow seed query: %s\n%s", metrics.describe(), metrics.plan)
+        if l.isEnabledFor(logging.DEBUG):
+            l.debug("Seed query %s", json.dumps(metrics.as_dict(), default=str))
+        if self.callback:
+            self.callback(metrics)
+
+    def recent(self, count=None) -> list:
+        with self._lock:
+            metrics = list(self.history)
+        return metrics[-count:] if count else metrics
+
+    def summary(self) -> dict:
+        """
+        Per query kind: the number of recorded queries, and the mean and maximum time of each stage.
+        """
+        by_kind = {}
+        for metrics in self.recent():
+            by_kind.setdefault(metrics.kind, []).append(metrics)
+        summary = {}
+        for kind, entries in by_kind.items():
+            stats = {"count": len(entries)}
+            for stage in STAGES + ["total"]:
+                values = [getattr(metrics, stage) for metrics in entries if getattr(metrics, stage) is not None]
+                if values:
+                    stats[stage] = {"mean": sum(values) / len(values), "max": max(values)}
+            summary[kind] = stats
+        return summary
+
+
+@contextmanager
+def capture_statements(connection):
+    """
+    Collect the (statement, parameters) pairs sent to the database on a connection, as the DBAPI receives them.
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(connection, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(connection, "before_cursor_execute", before_cursor_execute)
+
+
+def explain(session, statement, parameters):
+    """
+    Return the query plan of a statement captured by capture_statements, or None if it cannot be explained.
+    """
+    is_sqlite = isinstance(session.bind.dialect, sqlite.dialect)
+    prefix = "EXPLAIN QUERY PLAN " if is_sqlite else "EXPLAIN "
+    try:
+        rows = session.connection().exec_driver_sql(prefix + statement, parameters).fetchall()
+    except Exception as e:
+        l.debug("Unable to explain seed query: %s", e)
+        return None
+    # SQLite returns (id, parent, notused, detail), Postgres a single column of plan lines
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+@contextmanager
+def timed(metrics: QueryMetrics, stage: str):
+    """
+    Add the time spent in the block to a stage of metrics.
+    """
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        setattr(metrics, stage, (getattr(metrics, stage) or 0) + perf_counter() - start)
@@ -0,0 +1,105 @@
+"""
+Pool of warm database connections shared by the seed table's queries, event ingestion and transfers.
+
+Slacrs hands out sessions on its own engine, whose pool is sized for angr-management's other users. The seed table
+gets a dedicated engine on the same database instead, with explicit size limits and pre-ping, so page flips reuse
+an open connection and a connection dropped by the server is replaced transparently.
+"""
+import threading
+
+from contextlib import contextmanager
+from time import monotonic
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+
+class SeedSessionPool:
+    """
+    Bounded pool of sessions. At most pool_size + max_overflow connections are open at once; session() waits up to
+    timeout seconds for a free one and always gives it back when the block exits.
+    """
+    def __init__(self, instance, pool_size=4, max_overflow=4, timeout=30, recycle=1800):
+        session = instance.session()
+        try:
+            bind = session.get_bind()
+        finally:
+            session.close()
+
+        url = bind.url
+        if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+            # an in-memory database only exists on the connection that created it
+            self.engine = bind
+            self.owns_engine = False
+        else:
+            connect_args = {"check_same_thread": False} if url.get_backend_name() == "sqlite" else {}
+            self.engine = create_engine(url, poolclass=QueuePool, pool_size=pool_size, max_overflow=max_overflow,
+                                        pool_timeout=timeout, pool_recycle=recycle, pool_pre_ping=True,
+                                        connect_args=connect_args)
+            self.owns_engine = True
+        self.sessionmaker = sessionmaker(bind=self.engine)
+
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.sessions = 0
+        self.active = 0
+        self.wait_time = 0.0
+        event.listen(self.engine, "connect", self._on_connect)
+        event.listen(self.engine, "checkout", self._on_checkout)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+
+    @contextmanager
+    def session(self):
+        """
+        Yield a session on a pooled connection. The connection is checked out right away, so waiting for a free
+        connection is accounted for here rather than at the first statement.
+        """
+        start = monotonic()
+        session = self.sessionmaker()
+        with self._lock:
+            self.sessions += 1
+            self.active += 1
+        try:
+            session.connection()
+            with self._lock:
+                self.wait_time += monotonic() - start
+            yield session
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+            with self._lock:
+                self.active -= 1
+
+    def stats(self) -> dict:
+        """
+        Pool counters for monitoring: connections opened, checkouts and sessions served, sessions in use, total time
+        spent acquiring connections, and SQLAlchemy's own pool status.
+        """
+        pool = self.engine.pool
+        with self._lock:
+            stats = {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "sessions": self.sessions,
+                "active": self.active,
+                "wait_time": self.wait_time,
+            }
+        if isinstance(pool, QueuePool):
+            stats.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow())
+        stats["status"] = pool.status()
+        return stats
+
+    def dispose(self):
+        if self.owns_engine:
+            self.engine.dispose()
@@ -0,0 +1,122 @@
+"""
+Optional n-gram index over seed contents, used to narrow byte substring searches before exact verification.
+
+On Postgres this is a pg_trgm GIN index over encode(value, 'escape'), the text form of a bytea in which every byte
+maps to a fixed character sequence. A byte string contained in a seed therefore has its escaped form contained in the
+escaped seed, and the index can answer the LIKE on that text. The match is lossy (an escaped pattern can line up in
+the middle of an escape sequence), so callers keep the exact POSITION check on the raw bytes.
+
+On SQLite, which has no such expression index, the same escaped text is kept in an FTS5 side table with the trigram
+tokenizer. The plugin adds the inputs created while it was not running when it starts, and newly created inputs of
+every target from the event stream.
+
+    python seed_search.py --database URL
+"""
+from sqlalchemy import Column, MetaData, Table, func, text
+from sqlalchemy.dialects import postgresql, sqlite
+
+try:
+    from slacrs import Slacrs
+    from slacrs.model import Input
+except ImportError as ex:
+    Slacrs = None
+
+try:
+    from .seed_backfill import insert_batched, missing_inputs, run_on_database
+except ImportError:
+    # run as a script
+    from seed_backfill import insert_batched, missing_inputs, run_on_database
+
+
+PG_TRGM_INDEX = "ix_inputs_value_trgm"
+
+FTS_TABLE = "input_search"
+
+# trigram indexes cannot narrow patterns shorter than one trigram
+MIN_INDEXED_LENGTH = 3
+
+# rows written to the FTS5 table per statement
+INDEX_BATCH_SIZE = 500
+
+search_table = Table(FTS_TABLE, MetaData(), Column("input_id"), Column("body"))
+
+
+def escape_bytes(value: bytes) -> str:
+    """
+    Python equivalent of Postgres' encode(value, 'escape').
+    """
+    out = []
+    for b in value:
+        if b == 0 or b >= 0x80:
+            out.append("\\%03o" % b)
+        elif b == 0x5c:
+            out.append("\\\\")
+        else:
+            out.append(chr(b))
+    return "".join(out)
+
+
+def create_search_index(session):
+    if isinstance(session.bind.dialect, postgresql.dialect):
+        table = Input.__table__.name
+        session.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        session.execute(text(f"CREATE INDEX IF NOT EXISTS {PG_TRGM_INDEX} ON {table} "
+                             f"USING gin (encode(value, 'escape') gin_trgm_ops)"))
+        session.commit()
+    elif isinstance(session.bind.dialect, sqlite.dialect):
+        session.execute(text(f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                             f"USING fts5(input_id UNINDEXED, body, tokenize='trigram')"))
+        session.commit()
+        index_inputs(session)
+    else:
+        raise ValueError(f"no search index available for {session.bind.dialect.name}")
+
+
+def index_inputs(session, input_ids=None):
+    """
+    Add inputs to the SQLite FTS5 table: the given ids, or every input that is not indexed yet. Inputs already in
+    the table are skipped either way.
+    """
+    query = missing_inputs(session.query(Input.id, Input.value), search_table, input_ids)
+    rows = ({"input_id": input_id, "body": escape_bytes(value)}
+            for input_id, value in query.yield_per(INDEX_BATCH_SIZE))
+    insert_batched(session, search_table, rows, INDEX_BATCH_SIZE)
+
+
+def search_index_kind(session):
+    """
+    Return the kind of search index present in the database, or None.
+    """
+    if isinstance(session.bind.dialect, postgresql.dialect):
+        found = session.execute(text("SELECT 1 FROM pg_indexes WHERE indexname = :name"),
+                                {"name": PG_TRGM_INDEX}).first()
+        if found:
+            return "pg_trgm"
+    elif isinstance(session.bind.dialect, sqlite.dialect):
+        found = session.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"),
+                                {"name": FTS_TABLE}).first()
+        if found:
+            return "fts5"
+    return None
+
+
+def search_filter(query, inp: bytes, kind):
+    """
+    Add the indexed candidate condition for a substring search to a query over Input. The exact match still has to
+    be applied by the caller.
+    """
+    if kind == "pg_trgm":
+        escaped = escape_bytes(inp)
+        if len(escaped) >= MIN_INDEXED_LENGTH:
+            query = query.filter(func.encode(Input.value, "escape").contains(escaped, autoescape=True))
+    elif kind == "fts5":
+        escaped = escape_bytes(inp)
+        if len(escaped) >= MIN_INDEXED_LENGTH:
+            phrase = '"' + escaped.replace('"', '""') + '"'
+            candidates = select(search_table.c.input_id).where(search_table.c.body.op("MATCH")(phrase))
+            query = query.filter(Input.id.in_(candidates))
+    return query
+
+
+if __name__ == "__main__":
+    run_on_database("Create the seed search index.", create_search_index)
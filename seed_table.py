@@ -1,13 +1,18 @@
-import asyncio
-import ctypes
-import psycopg2
+import os
+import sqlite3
 import threading
 
-from time import sleep
+from time import monotonic, perf_counter, sleep
 from typing import Dict, List
-from tornado.platform.asyncio import AnyThreadEventLoopPolicy
 from sqlalchemy.dialects import postgresql, sqlite
-from sqlalchemy import func, literal
+from sqlalchemy import case, distinct, exists, func, literal, select, text, tuple_
+
+from .seed_cache import BlobCache, LocalSeedCache, database_key, default_cache_dir
+from .seed_common import DEFAULT_SORT, SEED_TAGS, TAG_BITS, tags_to_mask
+from .seed_dedup import duplicate_count_column, has_hash_table, hash_inputs, unique_filter
+from .seed_metrics import MetricsRecorder, QueryMetrics, capture_statements, explain, timed
+from .seed_pool import SeedSessionPool
+from .seed_search import index_inputs, search_filter, search_index_kind
 
 
 try:
@@ -17,67 +22,525 @@ except ImportError as ex:
     Slacrs = None
 
 
+# number of leading bytes of a seed fetched for display; the full value is only loaded on demand
+PREVIEW_SIZE = 80
+
+
+def tag_mask_column():
+    """
+    Correlated scalar subquery computing the tag bitmask of each Input, so a page and its tags come back in a
+    single query. The sum of the distinct bits of an input's tags is their bitwise or.
+    """
+    bit = case(TAG_BITS, value=InputTag.value, else_=0)
+    tag_mask = select(func.sum(distinct(bit))).where(InputTag.input_id == Input.id).scalar_subquery()
+    return func.coalesce(tag_mask, 0)
+
+
+# approximate memory of a Seed beside its preview, display string and value: the slotted object, its timestamp, id
+# and the bytes/str object headers
+SEED_OVERHEAD = 240
+
 class Seed:
-    def __init__(self, seed: Input, id: int):
+    """
+    Compact, slotted row of the seed table. Only the preview of the value is kept until the full value is asked for,
+    tags are a bitmask, and the text shown for the value is rendered once, on first display.
+    """
+    __slots__ = ("created_at", "tag_mask", "_realid", "id", "_loader", "_value", "preview", "size", "_display",
+                 "duplicates")
+
+    def __init__(self, seed: Input, id: int, tag_mask: int = None, preview: bytes = None, size: int = None,
+                 loader=None, duplicates: int = None):
         self.created_at = seed.created_at
-        self.tags: List[str] = [x.value for x in seed.tags]
-        self.value: bytes = seed.value
+        if tag_mask is None:
+            tag_mask = tags_to_mask(x.value for x in seed.tags)
+        self.tag_mask: int = tag_mask
         self._realid = seed.id
-        self.id: str = hex(id)[2:].rjust(8, "0")
+        # position of the seed in the result it came with
+        self.id: int = id
+        self._loader = loader
+        self._display = None
+        # number of seeds of the target with the same content, in the deduplicated view
+        self.duplicates = duplicates
+        if preview is None:
+            self._value: bytes = seed.value
+            self.preview: bytes = seed.value[:PREVIEW_SIZE]
+            self.size: int = len(seed.value)
+        else:
+            self._value = None
+            self.preview = preview
+            self.size = size
+
+    @property
+    def value(self) -> bytes:
+        if self._value is None:
+            self._value = self._loader(self._realid)
+        return self._value
+
+    @property
+    def display(self) -> str:
+        """
+        Text shown for the value: the repr of its preview, ellipsized when the value is longer.
+        """
+        if self._display is None:
+            if self.size < PREVIEW_SIZE:
+                self._display = repr(self.preview)
+            else:
+                self._display = repr(self.preview[:PREVIEW_SIZE] + b"...")
+        return self._display
+
+    def memory_size(self) -> int:
+        """
+        Rough estimate of the memory held by this seed, used to bound the page cache.
+        """
+        size = SEED_OVERHEAD + len(self.preview)
+        if self._display is not None:
+            size += len(self._display)
+        if self._value is not None:
+            size += len(self._value)
+        return size
+
+    @property
+    def tags(self) -> List[str]:
+        return [tag for tag in SEED_TAGS if self.tag_mask & TAG_BITS[tag]]
+
+    def has_tag(self, tag: str) -> bool:
+        return bool(self.tag_mask & TAG_BITS[tag])
+
+    @property
+    def key(self):
+        """
+        Keyset pagination key of this seed, matching the (created_at, id) ordering used by query_seeds.
+        """
+        return self.created_at, self._realid
+
+    def sort_key(self, sort=DEFAULT_SORT):
+        """
+        Keyset pagination key of this seed in a sorted order, see SeedPageQuery.query_seeds.
+        """
+        column, _ = sort
+        if column == "size":
+            return (self.size,) + self.key
+        if column in TAG_BITS:
+            return (int(self.has_tag(column)),) + self.key
+        return self.key
+
+class SeedQuery:
+    """
+    One database query run by SeedQueryExecutor, which can be cancelled from another thread. Cancelling interrupts the
+    statement on its connection (psycopg2's cancel(), sqlite3's interrupt()), so the backend stops working on it right
+    away and the connection goes back to the pool once the query has unwound.
+    """
+    # requests for the same slot supersede each other
+    slot = None
+    kind = None
+
+    def __init__(self, pool, statement_timeout=None, recorder: MetricsRecorder = None, key=None):
+        self.pool = pool
+        self.statement_timeout = statement_timeout
+        self.recorder = recorder
+        self.metrics = QueryMetrics(self.kind, key=key)
+        self.generation = None
+        self.submitted_at = None
+        self.cancelled = False
+        self.done = threading.Event()
+        self._connection = None
+        self._lock = threading.Lock()
 
-class SeedQueryThread(threading.Thread):
-    def __init__(self, instance, inp, tags, offset, size, page_no, seed_callback):
-        threading.Thread.__init__(self)
-        self.instance = instance
+    def run(self):
+        self.metrics.slot = self.slot
+        if self.submitted_at is not None:
+            self.metrics.queue_wait = monotonic() - self.submitted_at
+        try:
+            start = perf_counter()
+            with self.pool.session() as session:
+                self.metrics.connect = perf_counter() - start
+                try:
+                    with self._lock:
+                        if self.cancelled:
+                            self.failed()
+                            return
+                        self._connection = session.connection().connection
+                    if self.statement_timeout and isinstance(session.bind.dialect, postgresql.dialect):
+                        session.execute(text(f"SET LOCAL statement_timeout = {int(self.statement_timeout)}"))
+                    self.execute(session)
+                finally:
+                    # before the connection goes back to the pool, where cancel() must no longer reach it
+                    with self._lock:
+                        self._connection = None
+        except Exception:
+            self.metrics.status = "failed"
+            self.failed()
+        finally:
+            self.done.set()
+            if self.recorder and not self.metrics.delivered:
+                if self.cancelled:
+                    self.metrics.status = "cancelled"
+                self.recorder.record(self.metrics)
+
+    def fetch(self, session, fetch):
+        """
+        Run fetch (e.g. query.all) as the SQL stage of this query. The plan of a slow query is captured with EXPLAIN.
+        """
+        with capture_statements(session.connection()) as statements:
+            with timed(self.metrics, "sql"):
+                result = fetch()
+        if self.recorder and statements and not self.cancelled and self.metrics.sql >= self.recorder.slow_query_time:
+            self.metrics.plan = explain(session, *statements[-1])
+        return result
+
+    def wait(self, timeout=None) -> bool:
+        return self.done.wait(timeout)
+
+    def execute(self, session):
+        raise NotImplementedError()
+
+    def failed(self):
+        pass
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            if self._connection is None:
+                return
+            interrupt = getattr(self._connection, "cancel", None) or getattr(self._connection, "interrupt", None)
+            if interrupt is not None:
+                interrupt()
+
+    def discard(self):
+        """
+        Drop a query that was superseded before it started.
+        """
+        self.cancelled = True
+        self.failed()
+        self.done.set()
+
+class SeedQueryExecutor:
+    """
+    Small pool of long-lived worker threads running seed queries. Submitted queries are debounced, and a query
+    replaces the pending query of its slot and cancels the running one, so a burst of filter changes only runs the
+    last request. At most one query per slot is on the database at a time.
+    """
+    def __init__(self, workers=2, debounce=0.15):
+        self.debounce = debounce
+        self.pending: Dict[str, SeedQuery] = {}
+        self.running: Dict[str, SeedQuery] = {}
+        self.cond = threading.Condition()
+        self.should_exit = False
+        self.workers = []
+        for _ in range(workers):
+            worker = threading.Thread(target=self._work)
+            worker.setDaemon(True)
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, query: SeedQuery) -> SeedQuery:
+        with self.cond:
+            superseded = self.pending.pop(query.slot, None)
+            if superseded:
+                superseded.discard()
+            running = self.running.get(query.slot)
+            if running:
+                running.cancel()
+            query.submitted_at = monotonic()
+            self.pending[query.slot] = query
+            self.cond.notify_all()
+        return query
+
+    def shutdown(self):
+        with self.cond:
+            self.should_exit = True
+            for query in self.pending.values():
+                query.discard()
+            self.pending.clear()
+            for query in self.running.values():
+                query.cancel()
+            self.cond.notify_all()
+
+    def _next(self):
+        with self.cond:
+            while not self.should_exit:
+                ready = [(query.submitted_at + self.debounce, slot) for slot, query in self.pending.items()
+                         if slot not in self.running]
+                if not ready:
+                    self.cond.wait()
+                    continue
+                due, slot = min(ready)
+                delay = due - monotonic()
+                if delay > 0:
+                    self.cond.wait(delay)
+                    continue
+                query = self.pending.pop(slot)
+                self.running[slot] = query
+                return query
+            return None
+
+    def _work(self):
+        while True:
+            query = self._next()
+            if query is None:
+                return
+            query.run()
+            with self.cond:
+                if self.running.get(query.slot) is query:
+                    del self.running[query.slot]
+                self.cond.notify_all()
+
+class SeedPageQuery(SeedQuery):
+    slot = "page"
+    kind = "page"
+
+    def __init__(self, pool, inp, tags, offset, size, page_no, seed_callback, after=None, before=None,
+                 value_loader=None, search_index=None, statement_timeout=None, key=None, recorder=None,
+                 local_cache=None):
+        super().__init__(pool, statement_timeout=statement_timeout, recorder=recorder, key=key)
+        self.local_cache = local_cache
+        self.key = key
+        self.target_image_id = key[0] if key else None
+        self.dedup = key[3] if key else False
+        self.sort = key[4] if key else DEFAULT_SORT
+        self.search_index = search_index
+        self.value_loader = value_loader
         self.inp = inp
         self.tags = tags
         self.offset = offset
         self.size = size
         self.page_no = page_no
         self.seed_callback = seed_callback
+        self.after = after
+        self.before = before
 
     def run(self):
+        if self.local_cache is not None and not self.cancelled and self.query_local():
+            return
+        super().run()
+
+    def query_local(self) -> bool:
+        """
+        Serve the page from the local cache without touching the database. Returns False when the cache cannot
+        answer it.
+        """
+        self.metrics.slot = self.slot
+        self.metrics.queue_wait = monotonic() - self.submitted_at
         try:
-            session = self.instance.session()
-            self.query_seeds(session, self.inp, self.tags, self.offset, self.size)
-        except Exception as e:
-            conn = session.connection()
-            conn.connection.cancel()
-            session.close()
-
-    def get_id(self):
-        if hasattr(self, '_thread_id'):
-            return self._thread_id
-        for id, thread in threading._active.items():
-            if thread is self:
-                return id
-
-    def kill_query(self):
-        thread_id = self.get_id()
-        ctypes.pythonapi.PyThreadState_SetAsyncExc(thread_id,
-              ctypes.py_object(SystemExit))
-
-    def query_seeds(self, session, inp: bytes, tags: List[str], offset: int, size: int):
-        seeds: List[Seed] = []
-        if session:
-            query = session.query(Input, func.count(Input.id).over().label('total'))
-
-            if inp:
-                if isinstance(session.bind.dialect, postgresql.dialect):
-                    query = query.filter(func.POSITION(literal(inp).op('in')(Input.value)) != 0)
-                elif isinstance(session.bind.dialect, sqlite.dialect):
-                    pass
-
-            if tags:
-                query = query.join(Input.tags)
-                for tag in tags:
-                    query = query.filter(Input.tags.any(InputTag.value == tag))
-
-            result = query.order_by(Input.created_at).limit(size).offset(offset).all()
-            count = result[0][1] if len(result) > 0 else 0
-            seeds = [Seed(seed[0], idx) for idx, seed in enumerate(result)]
-            session.close()
-            self.seed_callback(seeds, count=count, page_no=self.page_no)
+            with timed(self.metrics, "sql"):
+                result = self.local_cache.page(tags_to_mask(self.tags), self.offset, self.size, after=self.after,
+                                               before=self.before)
+        except sqlite3.Error:
+            return False
+        if result is None:
+            return False
+        self.metrics.status = "local"
+        self.deliver(result)
+        self.done.set()
+        if self.recorder and not self.metrics.delivered:
+            self.recorder.record(self.metrics)
+        return True
+
+    def execute(self, session):
+        self.query_seeds(session, self.inp, self.tags, self.offset, self.size, after=self.after, before=self.before)
+
+    def query_seeds(self, session, inp: bytes, tags: List[str], offset: int, size: int, after=None, before=None):
+        """
+        Query one page of seeds.
+
+        Seeds are ordered by (created_at, id), or by (size, created_at, id) or (tag flag, created_at, id) when sorted,
+        with every column in the same direction. When `after` or `before` is given (the Seed.sort_key of a seed of a
+        neighboring page), the page is located with a keyset condition instead of an offset, so its cost does not
+        depend on how deep the page is. The size order is answered by an index on length(value) (see seed_indexes).
+        A tag flag is not a column of inputs, so that order is queried as two groups, seeds without and with the
+        tag, each walked in (created_at, id) order.
+
+        See seed_query for the selected columns.
+        """
+        if not session:
+            return
+        base = filter_seeds(session, seed_query(session, self.value_loader, dedup=self.dedup),
+                            self.target_image_id, inp, tags, search_index=self.search_index, dedup=self.dedup)
+        column, descending = self.sort
+        columns = [Input.created_at, Input.id]
+        if column == "size":
+            columns.insert(0, func.length(Input.value))
+        grouped = column in TAG_BITS
+        if grouped:
+            flag = exists().where(InputTag.input_id == Input.id, InputTag.value == column)
+            groups = [(0, ~flag), (1, flag)]
+        else:
+            groups = [(None, None)]
+        if descending:
+            groups.reverse()
+
+        def fetch_group(condition, bound, backwards, group_offset, limit):
+            query = base if condition is None else base.filter(condition)
+            reverse = descending != backwards
+            if bound is not None:
+                sort_key = tuple_(*columns)
+                query = query.filter(sort_key < tuple_(*bound) if reverse else sort_key > tuple_(*bound))
+            order = [c.desc() if reverse else c for c in columns]
+            return self.fetch(session, query.order_by(*order).offset(group_offset).limit(limit).all)
+
+        result = []
+        if after is not None or before is not None:
+            backwards = before is not None
+            key = before if backwards else after
+            started = not grouped
+            for value, condition in (groups[::-1] if backwards else groups):
+                if not started:
+                    if value != key[0]:
+                        continue
+                    started = True
+                    bound = key[1:]
+                else:
+                    bound = key if not grouped else None
+                result += fetch_group(condition, bound, backwards, 0, size - len(result))
+                if len(result) >= size:
+                    break
+            if backwards:
+                result.reverse()
+        else:
+            for value, condition in groups:
+                rows = fetch_group(condition, None, False, offset, size - len(result))
+                result += rows
+                if len(result) >= size:
+                    break
+                if rows:
+                    offset = 0
+                elif offset:
+                    # the offset skips past this whole group
+                    count = filter_seeds(session, session.query(func.count(Input.id)), self.target_image_id, inp,
+                                         tags, search_index=self.search_index, dedup=self.dedup).filter(condition)
+                    offset = max(0, offset - self.fetch(session, count.scalar))
+
+        self.deliver(result)
+
+    def deliver(self, result):
+        with timed(self.metrics, "hydration"):
+            seeds = make_seeds(result, self.value_loader)
+        self.metrics.rows = len(seeds)
+        self.metrics.bytes = sum(len(seed.preview) if seed._value is None else len(seed._value) for seed in seeds)
+        if not self.cancelled:
+            # the model update is the last stage, whoever receives the page records the metrics
+            self.metrics.delivered = True
+            self.seed_callback(seeds, page_no=self.page_no, generation=self.generation, key=self.key,
+                               metrics=self.metrics)
+
+class SeedCountQuery(SeedQuery):
+    slot = "count"
+    kind = "count"
+
+    def __init__(self, seed_table, key, inp, tags):
+        super().__init__(seed_table.pool, statement_timeout=seed_table.statement_timeout,
+                         recorder=seed_table.recorder, key=key)
+        self.seed_table = seed_table
+        self.key = key
+        self.inp = inp
+        self.tags = tags
+
+    def execute(self, session):
+        query = session.query(func.count(Input.id))
+        query = filter_seeds(session, query, self.key[0], self.inp, self.tags,
+                             search_index=self.seed_table.search_index, dedup=self.key[3])
+        count = self.fetch(session, query.scalar)
+        self.metrics.rows = 1
+        if self.cancelled:
+            self.failed()
+        else:
+            self.seed_table.set_count(self.key, count)
+
+    def failed(self):
+        self.seed_table.count_failed(self.key)
+
+class SeedTagStatsQuery(SeedQuery):
+    slot = "tag-stats"
+    kind = "tag-stats"
+
+    def __init__(self, seed_table, target_image_id):
+        super().__init__(seed_table.pool, statement_timeout=seed_table.statement_timeout,
+                         recorder=seed_table.recorder)
+        self.seed_table = seed_table
+        self.target_image_id = target_image_id
+
+    def execute(self, session):
+        rows = self.fetch(session, tag_statistics(session, self.target_image_id).all)
+        self.metrics.rows = len(rows)
+        if self.cancelled:
+            self.failed()
+        else:
+            self.seed_table.set_tag_stats(self.target_image_id, {int(mask): count for mask, count in rows})
+
+    def failed(self):
+        self.seed_table.tag_stats_failed(self.target_image_id)
+
+def seed_query(session, value_loader=None, dedup=False):
+    """
+    Query selecting what a Seed is built from. When a value_loader is set, only the length and a PREVIEW_SIZE prefix
+    of each value are selected, and the full value is loaded through value_loader when a Seed's value is first
+    accessed. Tags are selected as a bitmask column, so no per-seed tag queries are needed. With dedup, the number
+    of seeds with the same content is selected too.
+    """
+    columns = [tag_mask_column().label("tag_mask")]
+    if dedup:
+        columns.append(duplicate_count_column().label("duplicates"))
+    if value_loader:
+        return session.query(Input.id, Input.created_at, func.length(Input.value).label("size"),
+                             func.substr(Input.value, 1, PREVIEW_SIZE).label("preview"), *columns)
+    return session.query(Input, *columns)
+
+def make_seeds(result, value_loader=None) -> List[Seed]:
+    if value_loader:
+        return [Seed(row, idx, tag_mask=row.tag_mask, preview=bytes(row.preview), size=row.size, loader=value_loader,
+                     duplicates=getattr(row, "duplicates", None))
+                for idx, row in enumerate(result)]
+    return [Seed(row[0], idx, tag_mask=row.tag_mask, duplicates=getattr(row, "duplicates", None))
+            for idx, row in enumerate(result)]
+
+def filter_seeds(session, query, target_image_id, inp: bytes, tags: List[str], search_index=None, dedup=False):
+    """
+    Scope a query over Input to a target image (None for every target) and apply the byte substring and tag filters
+    of the seed table. With a search_index (see seed_search), substring candidates are narrowed through the index
+    before the exact match. With dedup, only the first seed of each content is kept (see seed_dedup).
+    """
+    if target_image_id is not None:
+        query = query.filter(Input.target_image_id == target_image_id)
+    if inp:
+        query = search_filter(query, inp, search_index)
+        if isinstance(session.bind.dialect, postgresql.dialect):
+            query = query.filter(func.POSITION(literal(inp).op('in')(Input.value)) != 0)
+        elif isinstance(session.bind.dialect, sqlite.dialect):
+            query = query.filter(func.instr(Input.value, literal(inp)) != 0)
+
+    if tags:
+        query = query.filter(Input.id.in_(tagged_inputs(session, tags, target_image_id)))
+    if dedup:
+        query = unique_filter(query)
+    return query
+
+def tag_statistics(session, target_image_id):
+    """
+    Query the number of inputs of a target image per combination of known tags, as (tag bitmask, count) rows, with a
+    single grouped scan of input_tags. The count of any tag filter follows from these rows, see count_tagged.
+    """
+    bit = case(TAG_BITS, value=InputTag.value, else_=0)
+    masks = session.query(func.sum(distinct(bit)).label("mask")) \
+        .join(Input, Input.id == InputTag.input_id) \
+        .filter(Input.target_image_id == target_image_id) \
+        .group_by(InputTag.input_id) \
+        .subquery()
+    return session.query(masks.c.mask, func.count()).filter(masks.c.mask != 0).group_by(masks.c.mask)
+
+def tagged_inputs(session, tags: List[str], target_image_id=None):
+    """
+    Subquery of the ids of inputs carrying all of the given tags, as a single grouped scan of the input_tags of a
+    target image (of every target if target_image_id is None). Each input appears once, however many tags are
+    selected.
+    """
+    tags = set(tags)
+    query = session.query(InputTag.input_id).filter(InputTag.value.in_(tags))
+    if target_image_id is not None:
+        # only aggregate the tags of this target's corpus
+        query = query.join(Input, Input.id == InputTag.input_id).filter(Input.target_image_id == target_image_id)
+    return query \
+        .group_by(InputTag.input_id) \
+        .having(func.count(distinct(InputTag.value)) == len(tags))
 
 class SeedTable:
     """
@@ -85,21 +548,69 @@ class SeedTable:
     """
     query_signal = None
 
-    def __init__(self, workspace, query_signal, seed_callback=None):
+    # new input ids resolved per query while ingesting events
+    ingest_batch_size = 1000
+    # bounds of the event polling interval, in seconds; it backs off while no events arrive
+    poll_interval_min = 0.05
+    poll_interval_max = 2.0
+    # directory of the persistent local cache (see seed_cache), None to disable it
+    local_cache_dir = default_cache_dir()
+    # bytes of full seed values kept in the local cache
+    blob_cache_budget = 256 * 1024 * 1024
+    # seeds fetched per round trip while syncing the local cache
+    sync_batch_size = 1000
+    # newest cached seeds whose tags are read again on every sync, as tags can be added after their input
+    tag_refresh_window = 1000
+
+    def __init__(self, workspace, query_signal, seed_callback=None, count_callback=None, target_callback=None,
+                 live_callback=None, metrics_callback=None, stats_callback=None, invalidate_callback=None):
         self.workspace = workspace
         self.seed_callback = seed_callback
+        self.live_callback = live_callback
+        # called with (target_image_id, key) for every batch of new seeds of the current target, key being the filter
+        # the seeds were also delivered for through live_callback, or None
+        self.invalidate_callback = invalidate_callback
+        self.count_callback = count_callback
+        self.target_callback = target_callback
+        self.stats_callback = stats_callback
+        # filter key -> total number of matching seeds, kept up to date from the event stream
+        self.counts: Dict[tuple, int] = {}
+        self.counts_pending = set()
+        self.counts_lock = threading.Lock()
+        # target image id -> {tag bitmask: number of seeds}, kept up to date from the event stream like counts
+        self.tag_stats: Dict[object, Dict[int, int]] = {}
+        self.tag_stats_pending = set()
+        self.current_key = None
+        # bumped by every page request, so that results of superseded requests are dropped
+        self.generation = 0
+        self.search_index = None
+        # whether the seed_hashes table exists, and whether the deduplicated view is shown
+        self.hash_index = False
+        self.dedup = False
+        # (column, descending) order of the seed pages, see DEFAULT_SORT
+        self.sort = DEFAULT_SORT
+        # milliseconds after which the server aborts a seed query, None to disable
+        self.statement_timeout = 60000
+        # per-stage timings of the page and count queries
+        self.recorder = MetricsRecorder(metrics_callback)
         self.connector = None
         self.slacrs_instance = None
+        # sessions of every seed table query, created once the Slacrs instance is available
+        self.pool = None
+        # local cache of the current target's seeds, and of full values of every target
+        self.database = None
+        self.local_cache = None
+        self.blob_cache = None
         self.should_exit = False
         self.query_signal = query_signal
         self.is_querying = False
 
         self.init_instance()
 
+        self.executor = SeedQueryExecutor()
         self.slacrs_thread = threading.Thread(target=self.listen_for_events)
         self.slacrs_thread.setDaemon(True)
         self.slacrs_thread.start()
-        self.query_thread = None
 
 
     def init_instance(self) -> bool:
@@ -119,6 +630,9 @@ class SeedTable:
 
 
     def listen_for_events(self):
+        # imported here, the plugin does not need tornado until the listener starts
+        import asyncio
+        from tornado.platform.asyncio import AnyThreadEventLoopPolicy
         asyncio.set_event_loop_policy(AnyThreadEventLoopPolicy())
         while not self.connector:
             self.connector = self.workspace.plugins.get_plugin_instance_by_name("ChessConnector")
@@ -128,38 +642,363 @@ class SeedTable:
             self.slacrs_instance = self.connector.slacrs_instance()
             sleep(1)
 
+        self.pool = SeedSessionPool(self.slacrs_instance)
+        with self.pool.session() as session:
+            self.search_index = search_index_kind(session)
+            self.hash_index = has_hash_table(session)
+        self.backfill_indexes()
+        if self.local_cache_dir:
+            self.database = database_key(self.pool.engine.url)
+            try:
+                self.blob_cache = BlobCache(self.local_cache_dir, budget=self.blob_cache_budget)
+            except (OSError, sqlite3.Error) as e:
+                self.workspace.log(f"Unable to open the local seed cache: {e}")
+
         while not self.connector.target_image_id:
             sleep(1)
 
-        self.get_seeds()
-        self.query_thread.join()
+        self.target_changed()
 
         prev_target = self.connector.target_image_id
+        interval = self.poll_interval_min
         while not self.should_exit:
-            if self.connector.target_image_id != prev_target:
-                prev_target = self.connector.target_image_id
-                self.get_seeds()
-                self.query_thread.join()
-
-            new_event_count = self.slacrs_instance.fetch_events()
-            for _ in range(new_event_count):
-                e = self.slacrs_instance.event_queue.get_nowait()
-                session = self.slacrs_instance.session()
-                if e.kind == "input":
-                    obj = e.get_object(session)
-                    if session.query(Input).filter_by(id=e.object_id).filter_by(target_image_id=self.connector.target_image_id) == 1:
-                        seed = session.query(Input).filter_by(obj.object_id).one()
-                        self.seed_callback(seed)
-                session.close()
-
-    def get_seeds(self, inp=None, tags=[], offset=0, size=50, page_no=None):
-        if not self.slacrs_instance:
+            try:
+                if self.connector.target_image_id != prev_target:
+                    self.target_changed()
+                    prev_target = self.connector.target_image_id
+
+                input_ids = self.fetch_new_inputs()
+                if not input_ids:
+                    sleep(interval)
+                    interval = min(interval * 2, self.poll_interval_max)
+                    continue
+                interval = self.poll_interval_min
+                for i in range(0, len(input_ids), self.ingest_batch_size):
+                    self.ingest(input_ids[i:i + self.ingest_batch_size])
+            except Exception as e:
+                # a dropped connection or a failed insert must not end the listener, retry after backing off
+                self.workspace.log(f"Error while listening for new seeds: {e}")
+                sleep(interval)
+                interval = min(interval * 2, self.poll_interval_max)
+
+    def backfill_indexes(self):
+        """
+        Add the inputs created while the plugin was not running to the side tables searches and the deduplicated view
+        depend on.
+        """
+        try:
+            with self.pool.session() as session:
+                if self.search_index == "fts5":
+                    index_inputs(session)
+                if self.hash_index:
+                    hash_inputs(session)
+        except Exception as e:
+            self.workspace.log(f"Unable to update the seed search and hash indexes: {e}")
+
+    def fetch_new_inputs(self) -> list:
+        """
+        Drain the Slacrs event queue, returning the ids of the newly created inputs.
+        """
+        input_ids = []
+        new_event_count = self.slacrs_instance.fetch_events()
+        for _ in range(new_event_count):
+            e = self.slacrs_instance.event_queue.get_nowait()
+            if e.kind == "input":
+                input_ids.append(e.object_id)
+        return input_ids
+
+    def ingest(self, input_ids):
+        """
+        Resolve a batch of new inputs with one query and deliver the ones of the current target that match the
+        current filter to live_callback in a single call.
+        """
+        with self.pool.session() as session:
+            # searches and the deduplicated view of every target rely on the indexes, not only the current one
+            if self.search_index == "fts5":
+                index_inputs(session, input_ids)
+            if self.hash_index:
+                hash_inputs(session, input_ids)
+            target_image_id = self.connector.target_image_id
+            query = session.query(Input.id).filter(Input.id.in_(input_ids))
+            new_ids = [input_id for (input_id,) in filter_seeds(session, query, target_image_id, None, [])]
+            if not new_ids:
+                return
+
+            # the model places new seeds by the count from before them, so deliver them before the count deltas
+            current_key = self.current_key
+            live_key = None
+            if self.live_callback and current_key is not None and current_key[0] == target_image_id:
+                _, inp, tags, dedup, _ = current_key
+                query = seed_query(session, self.load_value, dedup=dedup).filter(Input.id.in_(new_ids))
+                query = filter_seeds(session, query, target_image_id, inp, list(tags),
+                                     search_index=self.search_index, dedup=dedup)
+                seeds = make_seeds(query.order_by(Input.created_at, Input.id).all(), self.load_value)
+                if seeds:
+                    self.live_callback(seeds, key=current_key)
+                    live_key = current_key
+            # cached pages of every other filter may be missing these seeds, whether or not any matched this one
+            if self.invalidate_callback:
+                self.invalidate_callback(target_image_id, live_key)
+
+            self.update_counts(session, new_ids)
+            self.update_tag_stats(session, target_image_id, new_ids)
+            self.sync_local_cache(session)
+
+    def target_changed(self):
+        self.open_local_cache()
+        if self.target_callback:
+            self.target_callback()
+        else:
+            self.get_seeds().wait()
+        # pages are served from what is cached so far while the delta is fetched
+        try:
+            with self.pool.session() as session:
+                self.sync_local_cache(session)
+        except Exception as e:
+            self.workspace.log(f"Unable to sync the local seed cache: {e}")
+
+    def open_local_cache(self):
+        if self.local_cache is not None:
+            # pages still being read from the previous target's cache fall back to the database
+            self.local_cache.close()
+            self.local_cache = None
+        if not self.local_cache_dir or not self.database:
+            return
+        try:
+            self.local_cache = LocalSeedCache(os.path.join(self.local_cache_dir, "targets"), self.database,
+                                              self.connector.target_image_id)
+        except (OSError, sqlite3.Error) as e:
+            self.workspace.log(f"Unable to open the local seed cache: {e}")
+
+    def sync_local_cache(self, session):
+        """
+        Fetch the seeds of the local cache's target past its high-water mark, then serve every page from it.
+        """
+        cache = self.local_cache
+        if cache is None:
+            return
+        query = seed_query(session, self.load_value).filter(Input.target_image_id == cache.target_image_id)
+        mark = cache.high_water_mark()
+        if mark is not None:
+            query = query.filter(tuple_(Input.created_at, Input.id) > tuple_(*mark))
+        batch = []
+        try:
+            for row in query.order_by(Input.created_at, Input.id).yield_per(self.sync_batch_size):
+                batch.append(row)
+                if len(batch) >= self.sync_batch_size:
+                    cache.add(batch)
+                    batch = []
+            if batch:
+                cache.add(batch)
+            recent = cache.recent_ids(self.tag_refresh_window)
+            if recent:
+                masks = session.query(Input.id, tag_mask_column()).filter(Input.id.in_(recent)).all()
+                cache.update_tags(masks)
+        except (OSError, sqlite3.Error) as e:
+            self.workspace.log(f"Disabling the local seed cache: {e}")
+            self.local_cache = None
+            return
+        cache.live = True
+
+    def close(self):
+        """
+        Stop listening for seeds and release the query threads, the pooled connections and the local caches.
+        """
+        self.should_exit = True
+        self.executor.shutdown()
+        local_cache, blob_cache = self.local_cache, self.blob_cache
+        self.local_cache = self.blob_cache = None
+        for cache in (local_cache, blob_cache):
+            if cache is not None:
+                cache.close()
+        if self.pool is not None:
+            self.pool.dispose()
+
+    def load_value(self, input_id) -> bytes:
+        key = f"{self.database}#{input_id}"
+        if self.blob_cache:
+            value = self.blob_cache.get(key)
+            if value is not None:
+                return value
+        with self.pool.session() as session:
+            value = session.query(Input.value).filter(Input.id == input_id).scalar()
+        if self.blob_cache and value is not None:
+            self.blob_cache.put(key, value)
+        return value
+
+    def filter_key(self, inp, tags):
+        """
+        Key identifying a filter of the current target and view mode: (target_image_id, inp, tags, dedup, sort).
+        Counts do not depend on the order, they are keyed by the first four.
+        """
+        target_image_id = self.connector.target_image_id if self.connector else None
+        return target_image_id, inp, tuple(tags or ()), self.dedup, self.sort
+
+    def is_current_count(self, key):
+        return self.current_key is not None and key == self.current_key[:4]
+
+    def get_count(self, inp=None, tags=[]):
+        """
+        Report the number of seeds matching a filter through count_callback. Counts are cached per filter key, so
+        the count query only runs the first time a filter is used.
+        """
+        if not self.pool:
+            return
+        self.current_key = self.filter_key(inp, tags)
+        key = self.current_key[:4]
+        with self.counts_lock:
+            count = self.counts.get(key)
+            if count is None:
+                if key in self.counts_pending:
+                    return
+                self.counts_pending.add(key)
+        if count is not None:
+            self.count_callback(count)
             return
 
-        if self.query_thread and self.query_thread.is_alive():
-            self.query_thread.kill_query()
+        # supersedes the count of a previous filter
+        self.executor.submit(SeedCountQuery(self, key, inp, tags))
+
+    def set_count(self, key, count):
+        with self.counts_lock:
+            self.counts_pending.discard(key)
+            self.counts[key] = count
+            is_current = self.is_current_count(key)
+        if is_current and self.count_callback:
+            self.count_callback(count)
+
+    def count_failed(self, key):
+        with self.counts_lock:
+            self.counts_pending.discard(key)
+
+    def update_counts(self, session, input_ids):
+        """
+        Apply the deltas for newly created inputs to every cached count of the current target, instead of
+        recounting the whole corpus. Only the new inputs are matched against each cached filter.
+        """
+        if not input_ids:
+            return
+        target_image_id = self.connector.target_image_id
+        with self.counts_lock:
+            keys = [key for key in self.counts if key[0] == target_image_id]
+        for key in keys:
+            _, inp, tags, dedup = key
+            query = session.query(func.count(Input.id)).filter(Input.id.in_(input_ids))
+            delta = filter_seeds(session, query, target_image_id, inp, list(tags),
+                                 search_index=self.search_index, dedup=dedup).scalar()
+            if delta:
+                with self.counts_lock:
+                    if key not in self.counts:
+                        continue
+                    self.counts[key] += delta
+                    count = self.counts[key]
+                    is_current = self.is_current_count(key)
+                if is_current and self.count_callback:
+                    self.count_callback(count)
+
+    def get_tag_stats(self):
+        """
+        Report the tag bitmask histogram of the current target through stats_callback, querying it the first time a
+        target is shown.
+        """
+        if not self.pool:
+            return
+        target_image_id = self.filter_key(None, [])[0]
+        with self.counts_lock:
+            histogram = self.tag_stats.get(target_image_id)
+            if histogram is None:
+                if target_image_id in self.tag_stats_pending:
+                    return
+                self.tag_stats_pending.add(target_image_id)
+            else:
+                histogram = dict(histogram)
+        if histogram is not None:
+            if self.stats_callback:
+                self.stats_callback(target_image_id, histogram)
+            return
+        self.executor.submit(SeedTagStatsQuery(self, target_image_id))
+
+    def set_tag_stats(self, target_image_id, histogram):
+        with self.counts_lock:
+            self.tag_stats_pending.discard(target_image_id)
+            self.tag_stats[target_image_id] = histogram
+        if self.stats_callback:
+            self.stats_callback(target_image_id, dict(histogram))
+
+    def tag_stats_failed(self, target_image_id):
+        with self.counts_lock:
+            self.tag_stats_pending.discard(target_image_id)
+
+    def update_tag_stats(self, session, target_image_id, input_ids):
+        """
+        Add the tag bitmasks of newly created inputs to the cached histogram of their target. Like the event stream,
+        this assumes an input is tagged when it is created.
+        """
+        with self.counts_lock:
+            if target_image_id not in self.tag_stats:
+                return
+        masks = [mask for (mask,) in session.query(tag_mask_column()).filter(Input.id.in_(input_ids))]
+        with self.counts_lock:
+            histogram = self.tag_stats.get(target_image_id)
+            if histogram is None:
+                return
+            for mask in masks:
+                if mask:
+                    histogram[int(mask)] = histogram.get(int(mask), 0) + 1
+            histogram = dict(histogram)
+        if self.stats_callback:
+            self.stats_callback(target_image_id, histogram)
+
+    def get_seeds(self, inp=None, tags=[], offset=0, size=50, page_no=None, after=None, before=None, slot=None):
+        """
+        Request a page of seeds, delivered to seed_callback along with its filter key. A request with its own slot
+        (prefetches, virtual scroll blocks) runs beside the page request and is never dropped as stale, since its
+        result is cached under its key.
+        """
+        if not self.pool:
+            return
+
+        key = self.filter_key(inp, tags)
+        # the local cache holds every seed of its target, but neither values to search nor content hashes, and its
+        # tags are only refreshed for the newest seeds, so tag filters go to the database
+        local_cache = self.local_cache
+        if local_cache is None or local_cache.target_image_id != key[0] or inp or tags or self.dedup \
+                or self.sort != DEFAULT_SORT:
+            local_cache = None
+        query = SeedPageQuery(self.pool, inp, tags, offset, size, page_no or 1, self.page_ready,
+                              after=after, before=before, value_loader=self.load_value,
+                              search_index=self.search_index, statement_timeout=self.statement_timeout,
+                              key=key, recorder=self.recorder, local_cache=local_cache)
+        if slot:
+            query.slot = slot
+            return self.executor.submit(query)
 
         self.query_signal.querySignal.emit(True)
-        self.query_thread = SeedQueryThread(self.slacrs_instance, inp, tags, offset, size, page_no, self.seed_callback)
-        self.query_thread.setDaemon(True)
-        self.query_thread.start()
+        self.generation += 1
+        query.generation = self.generation
+        self.executor.submit(query)
+        if offset == 0 and after is None and before is None:
+            # the count runs alongside the first page of a filter
+            self.get_count(inp, tags)
+        return query
+
+    def page_ready(self, seeds, page_no=None, generation=None, key=None, metrics=None):
+        if generation is not None and generation != self.generation:
+            # a newer request superseded this one while it was running
+            if metrics is not None:
+                metrics.status = "stale"
+                self.record_metrics(metrics)
+            return
+        self.seed_callback(seeds, page_no=page_no, key=key, metrics=metrics)
+
+    def record_metrics(self, metrics):
+        """
+        Record the metrics of a page once its seeds are shown, see SeedPageQuery.query_seeds.
+        """
+        self.recorder.record(metrics)
+
+    def pool_stats(self) -> dict:
+        """
+        Connection pool statistics, see SeedSessionPool.stats.
+        """
+        return self.pool.stats() if self.pool else {}
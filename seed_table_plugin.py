@@ -1,6 +1,6 @@
 import time
 
-from PySide2.QtCore import Qt, QAbstractTableModel, QModelIndex, QEvent, Signal, QObject
+from PySide2.QtCore import Qt, QAbstractTableModel, QModelIndex, QEvent, Signal, QObject, QTimer
 from PySide2.QtGui import QCursor
 from PySide2.QtWidgets import (
     QVBoxLayout,
@@ -12,49 +12,118 @@ from PySide2.QtWidgets import (
     QHBoxLayout,
     QComboBox,
     QLabel,
-    QPushButton, QLineEdit, QCheckBox, QMenu, QFileDialog,
+    QPushButton, QLineEdit, QCheckBox, QMenu, QFileDialog, QPlainTextEdit,
 )
 
 from angrmanagement.plugins import BasePlugin
 from angrmanagement.ui.views import BaseView
 from angrmanagement.ui.workspace import Workspace
 from math import ceil
-from collections import defaultdict
 import codecs
 
-from .seed_table import SeedTable
+from .seed_common import DEFAULT_SORT, SeedPageCache, TAG_BITS, count_tagged
 
 class querySignaler(QObject):
     querySignal = Signal(bool)
+    # carry results of the query threads over to the GUI thread
+    pageSignal = Signal(object, object, object, object)
+    liveSignal = Signal(object, object)
+    invalidateSignal = Signal(object, object)
+    countSignal = Signal(int)
+    reloadSignal = Signal()
+    transferSignal = Signal(str)
+    metricsSignal = Signal(object)
+    statsSignal = Signal(object, object)
 
 class SeedTableModel(QAbstractTableModel):
 
-    def __init__(self, workspace, table, dropdown, countlabel):
+    def __init__(self, workspace, table, dropdown, countlabel, cache_budget=64 * 1024 * 1024):
         super(SeedTableModel, self).__init__()
         self.query_signal = querySignaler()
         self.query_signal.querySignal.connect(self.querySignalHandle)
-        self.seed_db = SeedTable(workspace, self.query_signal, seed_callback=self.add_seed)
+        self.query_signal.pageSignal.connect(self.add_seed)
+        self.query_signal.liveSignal.connect(self.queue_seeds)
+        self.query_signal.invalidateSignal.connect(self.invalidate_pages)
+        self.query_signal.countSignal.connect(self.set_count)
+        self.query_signal.reloadSignal.connect(self.reload)
+        self.query_signal.transferSignal.connect(self.countlabel_message)
+        # created by start, the first time the seeds are needed
+        self.seed_db = None
+        # live seeds are buffered and added at most once per frame
+        self.live_seeds = []
+        self.live_key = None
+        self.live_timer = QTimer()
+        self.live_timer.setSingleShot(True)
+        self.live_timer.setInterval(16)
+        self.live_timer.timeout.connect(self.flush_seeds)
         self.countlabel = countlabel
         self.table = table
         self.workspace = workspace
         self.page_dropdown = dropdown
         self.headers = ["ID", "Input", "NC", "C", "NT", "L", "E"]
+        # shown after the tag columns in the deduplicated view
+        self.dedup_header = "Dups"
+        # column -> tag bit shown in it
+        self.column_tags = {
+            2: TAG_BITS["non-crashing"],
+            3: TAG_BITS["crashing"],
+            4: TAG_BITS["non-terminating"],
+            5: TAG_BITS["leaking"],
+            6: TAG_BITS["exploit"],
+        }
+        # column -> sort order of the seed pages, see SeedPageQuery.query_seeds
+        self.column_sorts = {
+            0: "created_at",
+            1: "size",
+            2: "non-crashing",
+            3: "crashing",
+            4: "non-terminating",
+            5: "leaking",
+            6: "exploit",
+        }
         #self.seeds = []
-        self.pages = defaultdict(list)
+        # (target_image_id, inp, tags, page) -> seeds, virtual scroll blocks use ("block", n) as page
+        self.pages = SeedPageCache(cache_budget)
         self.inp = None
-        self.tags = None
+        self.tags = []
 
         # pagination support
         self.current_page = 1
         self.max_pages = 1
         self.entries_per_page = 50
-
+        self.count = 0
+
+        # virtual scroll support: every seed of the filter is a row, loaded in blocks as the view asks for them
+        self.virtual_scroll = False
+        self.block_size = 200
+        # block request parity -> block being loaded, see request_block
+        self.loading_blocks = {}
+
+    def start(self):
+        """
+        Create the SeedTable, which loads the database machinery and starts listening for seeds. This is deferred
+        until the view is first shown or a target image is set, so loading the plugin stays cheap.
+        """
+        if self.seed_db is not None:
+            return
+        from .seed_table import SeedTable
+        self.seed_db = SeedTable(self.workspace, self.query_signal,
+                                 seed_callback=lambda seeds, page_no=None, key=None, metrics=None:
+                                 self.query_signal.pageSignal.emit(seeds, page_no, key, metrics),
+                                 count_callback=self.query_signal.countSignal.emit,
+                                 target_callback=self.query_signal.reloadSignal.emit,
+                                 live_callback=lambda seeds, key=None: self.query_signal.liveSignal.emit(seeds, key),
+                                 invalidate_callback=self.query_signal.invalidateSignal.emit,
+                                 metrics_callback=self.query_signal.metricsSignal.emit,
+                                 stats_callback=self.query_signal.statsSignal.emit)
         self.set_page(1)
 
     def rowCount(self, index=QModelIndex()):
-        if self.current_page not in self.pages:
+        if self.seed_db is None:
             return 0
-        return len(self.pages[self.current_page])
+        if self.virtual_scroll:
+            return self.count
+        return len(self.page_seeds())
 
     def columnCount(self, index=QModelIndex()):
         return len(self.headers)
@@ -63,85 +132,382 @@ class SeedTableModel(QAbstractTableModel):
         if status:
             self.countlabel.setText("<font color=#ff0000>Querying..</font>")
             self.countlabel.repaint()
-    # probably not useful anymore. kept for not wanting to do it again.
-    # def canFetchMore(self, index=QModelIndex()):
-    #     return len(self.seeds) > self.num_loaded
-    #
-    # def fetchMore(self, index=QModelIndex()):
-    #     num_to_fetch = min(len(self.seeds) - self.num_loaded, 50)
-    #     self.beginInsertRows(QModelIndex(), self.num_loaded, self.num_loaded+num_to_fetch-1)
-    #     self.num_loaded += num_to_fetch
-    #     self.endInsertRows()
-    #     self.table.resizeEvent(QResizeEvent(self.table.size(), QSize()))
 
-    def set_page(self, pagenum):
+    def set_virtual_scroll(self, enabled):
+        self.virtual_scroll = enabled
+        self.reload()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """
+        Order the seeds by a column on the database side. Pages of each order are cached separately.
+        """
+        if self.seed_db is None:
+            return
+        if column not in self.column_sorts:
+            # keep the indicator on the order actually shown
+            name, descending = self.seed_db.sort
+            current = next(c for c, sort_name in self.column_sorts.items() if sort_name == name)
+            self.table.horizontalHeader().setSortIndicator(current,
+                                                           Qt.DescendingOrder if descending else Qt.AscendingOrder)
+            return
+        sort = (self.column_sorts[column], order == Qt.DescendingOrder)
+        if sort == self.seed_db.sort:
+            return
+        self.seed_db.sort = sort
+        self.reload()
+
+    def set_dedup(self, enabled):
+        """
+        Show each seed content once, with the number of seeds sharing it in an extra column.
+        """
         self.beginResetModel()
-        page_changed = self.current_page != pagenum
-        if self.max_pages >= pagenum > 0:
-            self.current_page = pagenum
-        else:
-            return False
-        # load seeds for page
-        min_index = (pagenum - 1) * self.entries_per_page
-        # check to ensure we arent out of bounds
-        if page_changed:
-            self.seed_db.get_seeds(inp=self.inp, tags=self.tags, offset=min_index, size=self.entries_per_page, page_no=self.current_page)
+        self.seed_db.dedup = enabled
+        if enabled and self.dedup_header not in self.headers:
+            self.headers.append(self.dedup_header)
+        elif not enabled and self.dedup_header in self.headers:
+            self.headers.remove(self.dedup_header)
         self.endResetModel()
-        return True
+        self.reload()
+
+    def block_key(self, block):
+        return self.seed_db.filter_key(self.inp, self.tags) + (("block", block),)
+
+    def is_partial(self, key, seeds) -> bool:
+        """
+        Whether a cached page or block, by its page cache key, holds fewer seeds than fit in it.
+        """
+        return len(seeds) < (self.block_size if isinstance(key[-1], tuple) else self.entries_per_page)
+
+    def seed_at(self, row):
+        """
+        Return the seed shown in a row, or None while it is being loaded.
+        """
+        if not self.virtual_scroll:
+            return self.page_seeds()[row]
+        block, offset = divmod(row, self.block_size)
+        seeds = self.pages.get(self.block_key(block))
+        if seeds is None:
+            self.request_block(block)
+            return None
+        return seeds[offset] if offset < len(seeds) else None
+
+    def request_block(self, block):
+        """
+        Load a block of rows. Blocks are requested in two slots by parity, so the (at most two) blocks under the
+        viewport load together, while a request for a block scrolled past is superseded by the next one.
+        """
+        parity = block % 2
+        if self.loading_blocks.get(parity) == block:
+            return
+        self.loading_blocks[parity] = block
+        after = before = None
+        prev_block = self.pages.peek(self.block_key(block - 1))
+        next_block = self.pages.peek(self.block_key(block + 1))
+        if prev_block and len(prev_block) == self.block_size:
+            after = prev_block[-1].sort_key(self.seed_db.sort)
+        elif next_block:
+            before = next_block[0].sort_key(self.seed_db.sort)
+        self.seed_db.get_seeds(inp=self.inp, tags=self.tags, offset=block * self.block_size, size=self.block_size,
+                               page_no=("block", block), after=after, before=before, slot=f"block-{parity}")
+
+    def block_loaded(self, block):
+        parity = block % 2
+        if self.loading_blocks.get(parity) == block:
+            del self.loading_blocks[parity]
+        first = block * self.block_size
+        last = min(first + self.block_size, self.count) - 1
+        if last >= first:
+            self.dataChanged.emit(self.index(first, 0), self.index(last, len(self.headers) - 1))
+        # repaint so that rows of superseded block requests are asked for again
+        self.table.viewport().update()
+
+    def page_key(self, pagenum):
+        return self.seed_db.filter_key(self.inp, self.tags) + (pagenum,)
+
+    def page_seeds(self, pagenum=None):
+        seeds = self.pages.peek(self.page_key(pagenum or self.current_page))
+        return seeds if seeds is not None else []
 
-    def add_seed(self, seed, count=None, page_no=None):
+    def set_page(self, pagenum):
+        if self.seed_db is None or not self.max_pages >= pagenum > 0:
+            return False
         self.beginResetModel()
-        # more complex logic here.. probably
-        page = page_no if page_no else self.current_page
-        if isinstance(seed, list):
-            cur_len = len(self.pages[page])
-            seed_list = seed if len(seed) + cur_len < self.entries_per_page else seed[:self.entries_per_page-cur_len]
-            self.pages[page].extend(seed_list)
-            #self.seeds.extend(seed if len(seed) + cur_len < self.entries_per_page else seed[:self.entries_per_page-cur_len])
-        else:
-            if len(self.pages[page]) < self.entries_per_page:
-                self.pages[page].append(seed)
-            else:
-                self.max_pages += 1
-                self.pages[page+1].append(seed)
-
-        # update our page
-        if count:
-            self.max_pages = max(ceil(count / self.entries_per_page), 1)
-        self.set_page(self.current_page)
-        self.page_dropdown.clear()
-        self.page_dropdown.addItems(list(map(str, range(1, self.max_pages+1))))
-        self.countlabel.setText(f"Count: {count}")
+        self.current_page = pagenum
+        cached = self.pages.get(self.page_key(pagenum)) is not None
+        if not cached:
+            # load seeds for page
+            min_index = (pagenum - 1) * self.entries_per_page
+            after, before = self.boundary_keys(pagenum)
+            self.seed_db.get_seeds(inp=self.inp, tags=self.tags, offset=min_index, size=self.entries_per_page,
+                                   page_no=self.current_page, after=after, before=before)
         self.endResetModel()
+        if cached:
+            self.prefetch()
+        return True
+
+    def set_filter(self, inp, tags):
+        self.inp = inp
+        self.tags = tags
+        self.reload()
 
-    def clear_seeds(self):
+    def reload(self):
+        """
+        Show the first page of the current filter, from the page cache when possible.
+        """
+        if self.seed_db is None:
+            return
         self.beginResetModel()
-        self.pages = defaultdict(list)
+        self.count = 0
+        self.loading_blocks = {}
+        self.endResetModel()
+        self.current_page = 1
         self.max_pages = 1
-        self.page_dropdown.clear()
-        self.page_dropdown.addItems(["1"])
+        self.live_seeds = []
+        self.sync_page_dropdown()
         self.countlabel.setText("Count: 0")
+        self.seed_db.get_count(self.inp, self.tags)
+        self.seed_db.get_tag_stats()
+        if not self.virtual_scroll:
+            self.set_page(1)
+
+    def prefetch(self):
+        """
+        Load the pages around the current one in the background, so that paging to them is instant.
+        """
+        if self.virtual_scroll:
+            return
+        seeds = self.page_seeds()
+        if not seeds:
+            return
+        next_page = self.current_page + 1
+        if next_page <= self.max_pages and len(seeds) == self.entries_per_page \
+                and self.page_key(next_page) not in self.pages:
+            self.seed_db.get_seeds(inp=self.inp, tags=self.tags, offset=self.current_page * self.entries_per_page,
+                                   size=self.entries_per_page, page_no=next_page,
+                                   after=seeds[-1].sort_key(self.seed_db.sort), slot="prefetch-next")
+        prev_page = self.current_page - 1
+        if prev_page >= 1 and self.page_key(prev_page) not in self.pages:
+            self.seed_db.get_seeds(inp=self.inp, tags=self.tags, offset=(prev_page - 1) * self.entries_per_page,
+                                   size=self.entries_per_page, page_no=prev_page,
+                                   before=seeds[0].sort_key(self.seed_db.sort), slot="prefetch-prev")
+
+    def boundary_keys(self, pagenum):
+        """
+        Return (after, before) keyset bounds for a page, taken from a neighboring page that is already loaded.
+        Both are None when no neighbor is cached, in which case the page is fetched by offset.
+        """
+        prev_page = self.pages.peek(self.page_key(pagenum - 1))
+        if prev_page and len(prev_page) == self.entries_per_page:
+            return prev_page[-1].sort_key(self.seed_db.sort), None
+        next_page = self.pages.peek(self.page_key(pagenum + 1))
+        if next_page:
+            return None, next_page[0].sort_key(self.seed_db.sort)
+        return None, None
+
+    def add_seed(self, seed, page_no=None, key=None, metrics=None):
+        start = time.perf_counter()
+        self.place_seeds(seed, page_no, key)
+        if metrics is not None:
+            metrics.model_update = time.perf_counter() - start
+            self.seed_db.record_metrics(metrics)
+
+    def place_seeds(self, seed, page_no, key):
+        page_key = key + (page_no,)
+        if isinstance(page_no, tuple):
+            self.pages.put(page_key, seed)
+            if self.virtual_scroll and key == self.seed_db.filter_key(self.inp, self.tags):
+                self.block_loaded(page_no[1])
+            return
+        self.pages.put(page_key, seed[:self.entries_per_page])
+        if page_key != self.page_key(self.current_page):
+            # prefetched or superseded page, only cached
+            return
+        self.beginResetModel()
         self.endResetModel()
-        self.set_page(1)
+        self.countlabel.setText(f"Count: {self.count}")
+        self.prefetch()
+
+    def drop_stale_pages(self, selects):
+        """
+        Drop the cached pages, selected by selects(key), that new seeds may be missing: partial pages and blocks,
+        and any page of a sorted order.
+        """
+        self.pages.discard(lambda k, s: selects(k) and (self.is_partial(k, s) or k[4] != DEFAULT_SORT))
+
+    def invalidate_pages(self, target_image_id, live_key=None):
+        """
+        New seeds arrived for a target. The pages of live_key are left to add_seeds, which appends the seeds
+        delivered for it.
+        """
+        self.drop_stale_pages(lambda k: k[0] == target_image_id and k[:-1] != live_key)
+
+    def queue_seeds(self, seeds, key=None):
+        if key != self.seed_db.filter_key(self.inp, self.tags):
+            # the filter changed since, these seeds will not be appended to its pages
+            self.drop_stale_pages(lambda k: k[:-1] == key)
+            return
+        if key != self.live_key:
+            self.live_seeds, self.live_key = [], key
+        self.live_seeds.extend(seeds)
+        if not self.live_timer.isActive():
+            self.live_timer.start()
+
+    def flush_seeds(self):
+        seeds, self.live_seeds = self.live_seeds, []
+        if seeds:
+            # dropped by add_seeds if the filter changed since they were queued
+            self.add_seeds(seeds, key=self.live_key)
+
+    def add_seeds(self, seeds, key=None):
+        """
+        Append a batch of new seeds of the current filter to the last pages. Rows landing on the visible page are
+        inserted into the view, other pages are only updated in the cache.
+        """
+        filter_key = self.seed_db.filter_key(self.inp, self.tags)
+        if key != filter_key:
+            self.drop_stale_pages(lambda k: k[:-1] == key)
+            return
+        # pages of other filters are dropped by invalidate_pages; the partial last block of this filter may be missing
+        # some of these seeds too
+        self.pages.discard(lambda k, s: k[:-1] == key and isinstance(k[-1], tuple) and self.is_partial(k, s))
+        if key[4] != DEFAULT_SORT:
+            # new seeds land anywhere in a sorted order, so every other page of it is fetched again when shown
+            self.pages.discard(lambda k, s: k[:-1] == key and k[-1] != self.current_page)
+            if self.virtual_scroll:
+                self.table.viewport().update()
+            return
+        if self.virtual_scroll:
+            # the rows are added by set_count; repaint so that rows placed in the dropped partial block, shown as
+            # loading until now, request it again
+            self.table.viewport().update()
+            return
+
+        page = self.max_pages
+        page_seeds = self.pages.peek(self.page_key(page))
+        if page_seeds is None and self.count > 0:
+            # the last page is not loaded, it will be fetched with the new seeds when shown; so is any partial page
+            # left over from before, which cannot take them
+            self.pages.discard(lambda k, s: k[:-1] == key and not isinstance(k[-1], tuple)
+                               and len(s) < self.entries_per_page)
+            seeds = []
+        touched = {page}
+        while seeds:
+            if page_seeds is None or len(page_seeds) >= self.entries_per_page:
+                if page_seeds is not None:
+                    page += 1
+                page_seeds = []
+                self.pages.put(self.page_key(page), page_seeds)
+                touched.add(page)
+            room = self.entries_per_page - len(page_seeds)
+            chunk, seeds = seeds[:room], seeds[room:]
+            if page == self.current_page:
+                first = len(page_seeds)
+                self.beginInsertRows(QModelIndex(), first, first + len(chunk) - 1)
+                page_seeds.extend(chunk)
+                self.endInsertRows()
+            else:
+                page_seeds.extend(chunk)
+        for touched_page in touched:
+            self.pages.resize(self.page_key(touched_page))
+        self.max_pages = max(self.max_pages, page)
+        self.sync_page_dropdown()
+
+    def set_count(self, count):
+        # buffered live seeds are placed by the count from before them, see SeedTable.ingest
+        if self.live_seeds:
+            self.live_timer.stop()
+            self.flush_seeds()
+        if self.virtual_scroll:
+            if count > self.count:
+                self.beginInsertRows(QModelIndex(), self.count, count - 1)
+                self.count = count
+                self.endInsertRows()
+            elif count < self.count:
+                self.beginResetModel()
+                self.count = count
+                self.endResetModel()
+        self.count = count
+        self.max_pages = max(ceil(count / self.entries_per_page), 1)
+        self.sync_page_dropdown()
+        self.countlabel.setText(f"Count: {count}")
+        self.prefetch()
+
+    def sync_page_dropdown(self):
+        """
+        Add or remove page numbers at the end of the page dropdown, instead of repopulating it.
+        """
+        shown = self.page_dropdown.count()
+        if shown < self.max_pages:
+            self.page_dropdown.addItems(list(map(str, range(shown + 1, self.max_pages + 1))))
+        else:
+            for i in range(shown - 1, self.max_pages - 1, -1):
+                self.page_dropdown.removeItem(i)
+        if self.page_dropdown.currentIndex() != self.current_page - 1:
+            self.page_dropdown.setCurrentIndex(self.current_page - 1)
+
+    def countlabel_message(self, message):
+        self.countlabel.setText(message)
+
+    def transfer_progress(self, verb):
+        def progress(done, total):
+            message = f"{verb} {done}/{total}" if total else f"{verb} {done}"
+            self.query_signal.transferSignal.emit(message)
+        return progress
+
+    def transfer_done(self, verb):
+        def done(result):
+            if isinstance(result, Exception):
+                self.workspace.log(f"Error {verb.lower()} seeds: {result}")
+                message = f"{verb} failed"
+            else:
+                message = f"{verb} {result} seeds, Count: {self.count}"
+            self.query_signal.transferSignal.emit(message)
+        return done
+
+    def export_seeds(self, path, input_ids=None):
+        """
+        Export the seeds with the given ids, or every seed of the current filter, in the background.
+        """
+        if self.seed_db is None or not self.seed_db.pool:
+            return None
+        from .seed_transfer import SeedTransferThread, export_seeds
+        target_image_id, inp, tags, dedup, _ = self.seed_db.filter_key(self.inp, self.tags)
+        thread = SeedTransferThread(self.seed_db.pool, export_seeds, path,
+                                    target_image_id=target_image_id, inp=inp, tags=tags, input_ids=input_ids,
+                                    search_index=self.seed_db.search_index, dedup=dedup, total=self.count,
+                                    progress=self.transfer_progress("Exporting"),
+                                    done_callback=self.transfer_done("Exported"))
+        thread.start()
+        return thread
+
+    def import_seeds(self, path, tags=()):
+        if self.seed_db is None:
+            return None
+        from .seed_transfer import SeedTransferThread, import_seeds
+        target_image_id = self.seed_db.filter_key(None, [])[0]
+        if not self.seed_db.pool or target_image_id is None:
+            return None
+        thread = SeedTransferThread(self.seed_db.pool, import_seeds, path, target_image_id, tags=tags,
+                                    progress=self.transfer_progress("Importing"),
+                                    done_callback=self.transfer_done("Imported"))
+        thread.start()
+        return thread
 
     def data(self, index, role=Qt.DisplayRole):
         col = index.column()
-        seed = self.pages[self.current_page][index.row()]
+        seed = self.seed_at(index.row())
         if role == Qt.DisplayRole:
+            if seed is None:
+                # placeholder while the block of this row is loading
+                return "..." if col < 2 else None
             if col == 0:
-                return seed.id
+                return f"{index.row():08x}"
             elif col == 1:
-                return repr(seed.value) if len(seed.value) < 80 else repr(seed.value[:80] + b"...")
-            elif col == 2 and "non-crashing" in seed.tags:
-                return "x"
-            elif col == 3 and "crashing" in seed.tags:
-                return "x"
-            elif col == 4 and "non-terminating" in seed.tags:
-                return "x"
-            elif col == 5 and "leaking" in seed.tags:
-                return "x"
-            elif col == 6 and "exploit" in seed.tags:
+                return seed.display
+            elif col in self.column_tags and seed.tag_mask & self.column_tags[col]:
                 return "x"
+            elif col == len(self.column_tags) + 2 and seed.duplicates is not None:
+                return seed.duplicates
             return None
         return None
 
@@ -155,15 +521,11 @@ class SeedTableModel(QAbstractTableModel):
 
     def go_next_page(self):
         if self.set_page(self.current_page + 1):
-            self.page_dropdown.clear()
-            self.page_dropdown.addItems(list(map(str, range(1, self.max_pages+1))))
-            self.page_dropdown.setCurrentIndex(self.current_page - 1)
+            self.sync_page_dropdown()
 
     def go_prev_page(self):
         if self.set_page(self.current_page - 1):
-            self.page_dropdown.clear()
-            self.page_dropdown.addItems(list(map(str, range(1, self.max_pages+1))))
-            self.page_dropdown.setCurrentIndex(self.current_page - 1)
+            self.sync_page_dropdown()
 
 
 class SeedTableWidget(QTableView):
@@ -183,17 +545,57 @@ class SeedTableWidget(QTableView):
         self.horizontalHeader().setDefaultAlignment(Qt.AlignLeft)
         self.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
         self.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        # sorted by the database, see SeedTableModel.sort; starts in the default (created_at, id) order
+        self.horizontalHeader().setSortIndicator(0, Qt.AscendingOrder)
+        self.setSortingEnabled(True)
 
     def contextMenuEvent(self, event:'PySide2.QtGui.QContextMenuEvent') -> None:
         rows = self.selectionModel().selectedIndexes()
         contextMenu = QMenu(self)
         saveSeed = contextMenu.addAction("&Save Seed")
+        exportSelected = contextMenu.addAction("Export Se&lected Seeds...")
+        exportFiltered = contextMenu.addAction("&Export Filtered Seeds...")
+        importSeeds = contextMenu.addAction("&Import Seeds...")
         action = contextMenu.exec_(QCursor.pos())
         if action == saveSeed:
             self.saveSeed(rows)
+        elif action == exportSelected:
+            self.exportSeeds(rows)
+        elif action == exportFiltered:
+            self.exportSeeds(None)
+        elif action == importSeeds:
+            self.importSeeds()
+
+    def exportSeeds(self, rows):
+        """
+        Export the selected rows, or every seed of the current filter when rows is None. A path without an archive
+        extension is created as a directory.
+        """
+        input_ids = None
+        if rows is not None:
+            seeds = [self.model().seed_at(row) for row in sorted({index.row() for index in rows})]
+            input_ids = [seed._realid for seed in seeds if seed is not None]
+            if not input_ids:
+                return
+        options = QFileDialog.Options()
+        options |= QFileDialog.DontUseNativeDialog
+        filters = "Directory (*);;Zip archive (*.zip);;Tar archive (*.tar *.tar.gz *.tgz)"
+        path = QFileDialog.getSaveFileName(self, "Export Seeds", "", filters, options=options)[0]
+        if path:
+            self.model().export_seeds(path, input_ids=input_ids)
+
+    def importSeeds(self):
+        options = QFileDialog.Options()
+        options |= QFileDialog.DontUseNativeDialog
+        path = QFileDialog.getExistingDirectory(self, "Import Seeds", "", options=options)
+        if path:
+            self.model().import_seeds(path)
 
     def saveSeed(self, rows):
-        data = self.model().page[rows[0].row()].value
+        seed = self.model().seed_at(rows[0].row())
+        if seed is None:
+            return
+        data = seed.value
         options = QFileDialog.Options()
         options |= QFileDialog.DontUseNativeDialog
         filename = QFileDialog.getSaveFileName(self, "Save Seed", "", "All Files(*)", options=options)[0]
@@ -212,6 +614,10 @@ class SeedTableView(BaseView):
         self.workspace = workspace
         self.instance = workspace.instance
         workspace.instance.project.am_subscribe(self.on_project_load)
+        # polls for a target image once a project is loaded, so the seeds are ready before the view is first shown
+        self.target_timer = QTimer()
+        self.target_timer.setInterval(1000)
+        self.target_timer.timeout.connect(self._check_target)
         self._init_widgets()
 
     def page_changed(self, i):
@@ -235,6 +641,15 @@ class SeedTableView(BaseView):
         self.table.init_parameters()  # need to set table model before messing with column resizing
         self.container.layout().addWidget(self.table)
 
+        # performance status panel, hidden until the Stats checkbox is ticked
+        self.stats_panel = QPlainTextEdit()
+        self.stats_panel.setReadOnly(True)
+        self.stats_panel.setMaximumHeight(160)
+        self.stats_panel.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self.stats_panel.setVisible(False)
+        self.table_data.query_signal.metricsSignal.connect(self._update_stats)
+        self.container.layout().addWidget(self.stats_panel)
+
         # create bottom section
         self.bottom_widget = QWidget()
         self.bottom_widget.setLayout(QHBoxLayout())
@@ -266,7 +681,29 @@ class SeedTableView(BaseView):
         self.l_checkbox.stateChanged.connect(self._on_filter_change)
         self.e_checkbox = QCheckBox("E")
         self.e_checkbox.stateChanged.connect(self._on_filter_change)
-
+        # virtual scroll toggle
+        self.scroll_checkbox = QCheckBox("Scroll")
+        self.scroll_checkbox.setToolTip("Show all seeds in one scrolling table instead of pages")
+        self.scroll_checkbox.stateChanged.connect(self._on_scroll_mode_change)
+        # deduplicated view toggle
+        self.dedup_checkbox = QCheckBox("Dedup")
+        self.dedup_checkbox.setToolTip("Show byte-identical seeds once, with their number of copies")
+        self.dedup_checkbox.stateChanged.connect(self._on_dedup_change)
+        # status panel toggle
+        self.stats_checkbox = QCheckBox("Stats")
+        self.stats_checkbox.setToolTip("Show query timings and connection pool statistics")
+        self.stats_checkbox.stateChanged.connect(self._on_stats_toggle)
+        # tag -> filter checkbox, labelled with the number of seeds checking it would match
+        self.tag_checkboxes = {
+            "non-crashing": self.nc_checkbox,
+            "crashing": self.c_checkbox,
+            "leaking": self.l_checkbox,
+            "non-terminating": self.nt_checkbox,
+            "exploit": self.e_checkbox,
+        }
+        self.tag_labels = {tag: checkbox.text() for tag, checkbox in self.tag_checkboxes.items()}
+        self.tag_histogram = None
+        self.table_data.query_signal.statsSignal.connect(self._on_tag_stats)
 
         self.bottom_widget.layout().addWidget(self.seed_count_label)
         self.bottom_widget.layout().addWidget(self.filter_box)
@@ -275,6 +712,9 @@ class SeedTableView(BaseView):
         self.bottom_widget.layout().addWidget(self.nt_checkbox)
         self.bottom_widget.layout().addWidget(self.l_checkbox)
         self.bottom_widget.layout().addWidget(self.e_checkbox)
+        self.bottom_widget.layout().addWidget(self.scroll_checkbox)
+        self.bottom_widget.layout().addWidget(self.dedup_checkbox)
+        self.bottom_widget.layout().addWidget(self.stats_checkbox)
         # self.bottom_widget.layout().addStretch()
         self.bottom_widget.layout().addWidget(self.prev_page_btn)
         self.bottom_widget.layout().addWidget(self.page_label)
@@ -288,10 +728,88 @@ class SeedTableView(BaseView):
         main_layout.addWidget(self.main)
         self.setLayout(main_layout)
 
+    def showEvent(self, event):
+        self.table_data.start()
+        super().showEvent(event)
+
     def on_project_load(self, **kwargs):
         if self.instance.project.am_none:
             return
-        pass
+        if self.table_data.seed_db is None:
+            self.target_timer.start()
+
+    def _check_target(self):
+        """
+        Start the seed table once the ChessConnector has a target image, without loading the database machinery
+        before that.
+        """
+        if self.table_data.seed_db is not None:
+            self.target_timer.stop()
+            return
+        connector = self.workspace.plugins.get_plugin_instance_by_name("ChessConnector")
+        if connector is not None and connector.target_image_id:
+            self.target_timer.stop()
+            self.table_data.start()
+
+    def _on_scroll_mode_change(self):
+        enabled = self.scroll_checkbox.isChecked()
+        self.table_data.set_virtual_scroll(enabled)
+        for widget in (self.prev_page_btn, self.page_label, self.page_dropdown, self.next_page_btn):
+            widget.setEnabled(not enabled)
+
+    def _on_dedup_change(self):
+        enabled = self.dedup_checkbox.isChecked()
+        if self.table_data.seed_db is None:
+            return
+        if enabled and not self.table_data.seed_db.hash_index:
+            self.workspace.log("The deduplicated view needs the seed_hashes table, create it with seed_dedup.py")
+            self.dedup_checkbox.blockSignals(True)
+            self.dedup_checkbox.setChecked(False)
+            self.dedup_checkbox.blockSignals(False)
+            return
+        self.table_data.set_dedup(enabled)
+
+    def _on_stats_toggle(self):
+        self.stats_panel.setVisible(self.stats_checkbox.isChecked())
+        self._update_stats()
+
+    def _update_stats(self, metrics=None):
+        """
+        Show the stages of the most recent queries, pool and cache usage, and the plan of the last slow query.
+        """
+        if not self.stats_panel.isVisible() or self.table_data.seed_db is None:
+            return
+        recorder = self.table_data.seed_db.recorder
+        recent = recorder.recent()
+        lines = [m.describe() for m in recent[-8:]]
+        pool = self.table_data.seed_db.pool_stats()
+        if pool:
+            lines.append(f"pool: {pool['connects']} connections opened, {pool['checkouts']} checkouts, "
+                         f"{pool['active']} sessions in use, {pool['wait_time'] * 1000:.1f}ms acquiring")
+        cache = self.table_data.pages
+        lines.append(f"page cache: {cache.used / 2**20:.1f} of {cache.budget / 2**20:.0f} MiB")
+        slow = [m for m in recent if m.plan]
+        if slow:
+            lines += ["", f"slow query: {slow[-1].describe()}", slow[-1].plan]
+        self.stats_panel.setPlainText("\n".join(lines))
+
+    def _on_tag_stats(self, target_image_id, histogram):
+        if target_image_id != self.table_data.seed_db.filter_key(None, [])[0]:
+            return
+        self.tag_histogram = histogram
+        self._update_tag_counts()
+
+    def _update_tag_counts(self):
+        """
+        Label each tag checkbox with the number of seeds of the current target carrying the selected tags and its own.
+        """
+        if self.tag_histogram is None:
+            return
+        selected = {tag for tag, checkbox in self.tag_checkboxes.items() if checkbox.isChecked()}
+        for tag, checkbox in self.tag_checkboxes.items():
+            count = count_tagged(self.tag_histogram, selected | {tag})
+            checkbox.setText(f"{self.tag_labels[tag]} ({count})")
+            checkbox.setToolTip(f"{count} seeds tagged {', '.join(sorted(selected | {tag}))}")
 
     def _on_filter_change(self):
         raw_filter = self.filter_box.text()
@@ -310,11 +828,8 @@ class SeedTableView(BaseView):
         if self.e_checkbox.isChecked():
             self.tags.append("exploit")
 
-        self.table_data.clear_seeds()
-        data = self.table_data.seed_db.get_seeds(inp=self.inp,
-                                                 tags=self.tags,
-                                                 offset=self.table_data.entries_per_page*(self.table_data.current_page-1),
-                                                 size=self.table_data.entries_per_page)
+        self.table_data.set_filter(self.inp, self.tags)
+        self._update_tag_counts()
 
 class SeedTableFilterBox(QLineEdit):
     def __init__(self, parent):
@@ -345,3 +860,8 @@ class SeedTablePlugin(BasePlugin):
         workspace.default_tabs += [self.seed_table_view]
         workspace.add_view(self.seed_table_view)
 
+    def teardown(self):
+        self.seed_table_view.target_timer.stop()
+        if self.seed_table_view.table_data.seed_db is not None:
+            self.seed_table_view.table_data.seed_db.close()
+
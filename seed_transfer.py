@@ -0,0 +1,181 @@
+"""
+Bulk export and import of seeds.
+
+Exports stream the selected inputs through a server-side cursor and write them one by one, to a directory or to a
+tar/zip archive, so the corpus is never held in memory. Imports insert a directory or archive of seed files as Input
+rows (and InputTag rows for the given tags) in large batches.
+"""
+import io
+import os
+import tarfile
+import threading
+import zipfile
+
+from contextlib import contextmanager
+from typing import List
+
+from .seed_table import filter_seeds
+
+try:
+    from slacrs.model import Input, InputTag
+except ImportError as ex:
+    Input = None
+
+
+# rows fetched per round trip while exporting
+EXPORT_BATCH_SIZE = 500
+# seeds inserted per transaction while importing
+IMPORT_BATCH_SIZE = 1000
+# progress is reported every that many seeds
+PROGRESS_INTERVAL = 100
+
+
+def archive_format(path: str):
+    """
+    Return "zip", "tar" or "tar:gz" for archive paths, and None for a directory.
+    """
+    lower = path.lower()
+    if lower.endswith(".zip"):
+        return "zip"
+    if lower.endswith(".tar.gz") or lower.endswith(".tgz"):
+        return "tar:gz"
+    if lower.endswith(".tar"):
+        return "tar"
+    return None
+
+
+@contextmanager
+def seed_writer(path: str):
+    """
+    Yield a write(name, data) function storing seeds in a directory or an archive.
+    """
+    fmt = archive_format(path)
+    if fmt == "zip":
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+            yield archive.writestr
+    elif fmt is not None:
+        with tarfile.open(path, "w:gz" if fmt == "tar:gz" else "w") as archive:
+            def write(name, data):
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+            yield write
+    else:
+        os.makedirs(path, exist_ok=True)
+
+        def write(name, data):
+            with open(os.path.join(path, name), "wb") as outfile:
+                outfile.write(data)
+        yield write
+
+
+def read_seeds(path: str):
+    """
+    Yield the contents of every seed file in a directory or an archive.
+    """
+    fmt = archive_format(path)
+    if fmt == "zip":
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    yield archive.read(info)
+    elif fmt is not None:
+        with tarfile.open(path) as archive:
+            for member in archive:
+                if member.isfile():
+                    yield archive.extractfile(member).read()
+    else:
+        for name in sorted(os.listdir(path)):
+            filename = os.path.join(path, name)
+            if os.path.isfile(filename):
+                with open(filename, "rb") as infile:
+                    yield infile.read()
+
+
+def export_seeds(session, path: str, target_image_id=None, inp: bytes = None, tags: List[str] = (),
+                 input_ids=None, search_index=None, dedup=False, total=None, progress=None, should_stop=None) -> int:
+    """
+    Write the seeds matching a filter, or the given input ids, to path. Returns the number of seeds written.
+    """
+    query = session.query(Input.id, Input.value)
+    if input_ids is not None:
+        query = query.filter(Input.id.in_(input_ids))
+        total = len(input_ids)
+    else:
+        query = filter_seeds(session, query, target_image_id, inp, list(tags), search_index=search_index,
+                             dedup=dedup)
+
+    written = 0
+    with seed_writer(path) as write:
+        for input_id, value in query.order_by(Input.created_at, Input.id).yield_per(EXPORT_BATCH_SIZE):
+            if should_stop and should_stop():
+                break
+            write(str(input_id), value)
+            written += 1
+            if progress and written % PROGRESS_INTERVAL == 0:
+                progress(written, total)
+    if progress:
+        progress(written, total)
+    return written
+
+
+def import_seeds(session, path: str, target_image_id, tags: List[str] = (), progress=None, should_stop=None) -> int:
+    """
+    Insert every seed file of a directory or archive as an input of target_image_id, tagged with tags. Returns the
+    number of seeds inserted.
+    """
+    inserted = 0
+    batch = []
+
+    def flush():
+        inputs = [Input(value=value, target_image_id=target_image_id) for value in batch]
+        session.add_all(inputs)
+        # assigns the input ids the tags refer to
+        session.flush()
+        session.add_all([InputTag(value=tag, input_id=inp.id) for inp in inputs for tag in tags])
+        session.commit()
+        session.expunge_all()
+        batch.clear()
+
+    for value in read_seeds(path):
+        if should_stop and should_stop():
+            break
+        batch.append(value)
+        inserted += 1
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            flush()
+            if progress:
+                progress(inserted, None)
+    if batch:
+        flush()
+    if progress:
+        progress(inserted, None)
+    return inserted
+
+
+class SeedTransferThread(threading.Thread):
+    """
+    Run an export or import in the background on a session of a SeedSessionPool. done_callback receives the number
+    of seeds transferred, or the exception that stopped the transfer.
+    """
+    def __init__(self, pool, transfer, *args, done_callback=None, **kwargs):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self.pool = pool
+        self.transfer = transfer
+        self.args = args
+        self.kwargs = kwargs
+        self.done_callback = done_callback
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+    def run(self):
+        try:
+            with self.pool.session() as session:
+                result = self.transfer(session, *self.args, should_stop=lambda: self.stopped, **self.kwargs)
+        except Exception as e:
+            result = e
+        if self.done_callback:
+            self.done_callback(result)